@@ -0,0 +1,210 @@
+"""
+Local stand-in for the OpenSenseMap API.
+
+The FakeOpenSenseMap class serves `GET /boxes/<id>` for a generated fleet of sense boxes
+with configurable latency, error rate and number of sensors per box, and counts the
+requests it receives. It is used by the load scenarios but can also be run standalone:
+
+    python -m benchmarks.fake_opensensemap --port 8081 --fleet-size 500 --latency 0.2
+
+Sense box ids of the fleet are `box-0000`, `box-0001`, ... Alternatively, the fleet and its
+responses are replayed from an archive recorded with `benchmarks.record`:
+
+    python -m benchmarks.fake_opensensemap --archive boxes.jsonl.gz --speed 10
+"""
+import argparse
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import random
+import threading
+import time
+
+from hive.opensensemap.recording import ReplayClient
+
+
+def fleet_ids(fleet_size: int):
+    """
+    Returns the sense box ids of a fleet with the given size.
+    """
+    return [f"box-{i:04d}" for i in range(fleet_size)]
+
+
+def fake_sense_box(sense_box_id: str, sensors: int = 20, value: float = None):
+    """
+    Returns an OpenSenseMap sense box document with the given number of sensors.
+    The first sensor is a temperature sensor, all measurements are created now.
+    """
+    created_at = datetime.now(timezone.utc).isoformat()
+    titles = ["Temperatur"] + [f"Sensor {i}" for i in range(1, sensors)]
+    return {
+        "_id": sense_box_id,
+        "name": f"fake-{sense_box_id}",
+        "sensors": [
+            {
+                "_id": f"{sense_box_id}-{i}",
+                "title": title,
+                "unit": "°C",
+                "sensorType": "fake",
+                "lastMeasurement": {
+                    "createdAt": created_at,
+                    "value": str(value if value is not None else random.uniform(5, 30)),
+                },
+            }
+            for i, title in enumerate(titles)
+        ],
+    }
+
+
+# pylint: disable=too-many-instance-attributes
+class FakeOpenSenseMap:
+    """
+    Threaded HTTP server imitating the OpenSenseMap API.
+    """
+
+    # pylint: disable=too-many-arguments
+    def __init__(
+        self,
+        *,
+        port: int = 0,
+        fleet_size: int = 3,
+        sensors: int = 20,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        replay: ReplayClient = None,
+    ):
+        self.replay = replay
+        self.fleet = set(replay.sense_box_ids if replay else fleet_ids(fleet_size))
+        self.sensors = sensors
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.calls = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        """
+        Returns the base URL to configure as OPEN_SENSE_MAP_API_BASE_URL.
+        """
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        """
+        Starts serving in a background thread.
+        """
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        Stops serving.
+        """
+        self._server.shutdown()
+        self._server.server_close()
+
+    def reset_calls(self) -> int:
+        """
+        Resets the request counter and returns its previous value.
+        """
+        with self._lock:
+            calls, self.calls = self.calls, 0
+        return calls
+
+    def respond(self, path: str):
+        """
+        Returns status code and body for the given request path.
+        """
+        with self._lock:
+            self.calls += 1
+        sense_box_id = path.rstrip("/").rsplit("/", 1)[-1]
+        if self.replay:
+            data = self.replay.fetch_sense_box(sense_box_id)
+            return (200, data) if data else (404, {"code": "NotFound"})
+        time.sleep(max(0.0, random.gauss(self.latency, self.jitter)))
+        if not path.startswith("/boxes/") or sense_box_id not in self.fleet:
+            return 404, {"code": "NotFound"}
+        if random.random() < self.error_rate:
+            return 500, {"code": "InternalServerError"}
+        return 200, fake_sense_box(sense_box_id, self.sensors)
+
+    @classmethod
+    def from_args(cls, args, port: int = 0):
+        """
+        Creates an instance from arguments parsed with `add_arguments`.
+        """
+        return cls(
+            port=port,
+            fleet_size=args.fleet_size,
+            sensors=args.sensors,
+            latency=args.latency,
+            jitter=args.jitter,
+            error_rate=args.error_rate,
+            replay=ReplayClient.load(args.archive, args.speed)
+            if args.archive
+            else None,
+        )
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            """
+            Request handler delegating to the FakeOpenSenseMap instance.
+            """
+
+            # pylint: disable=invalid-name
+            def do_GET(self):
+                """
+                Handles GET requests.
+                """
+                status_code, body = fake.respond(self.path)
+                payload = json.dumps(body).encode()
+                self.send_response(status_code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):  # pylint: disable=arguments-differ
+                pass
+
+        return Handler
+
+
+def add_arguments(parser: argparse.ArgumentParser, latency: float = 0.0):
+    """
+    Adds the arguments to configure a FakeOpenSenseMap to the given parser.
+    """
+    parser.add_argument("--fleet-size", type=int, default=3)
+    parser.add_argument("--sensors", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=latency)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--archive", help="replay fleet and responses from archive")
+    parser.add_argument("--speed", type=float, default=1.0, help="replay speed")
+
+
+def main():
+    """
+    Runs the fake OpenSenseMap API until interrupted.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n", maxsplit=1)[0])
+    parser.add_argument("--port", type=int, default=8081)
+    add_arguments(parser)
+    args = parser.parse_args()
+    fake = FakeOpenSenseMap.from_args(args, args.port).start()
+    print(f"Serving {len(fake.fleet)} sense boxes on {fake.base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        fake.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+"""
+Load scenarios for the hive app against local stand-ins.
+
+Starts a FakeOpenSenseMap server and the hive app (uvicorn) configured to use it and a
+local Redis, then hits each endpoint with concurrent clients for a fixed duration and
+reports p50/p99 latency, throughput, error responses and upstream calls:
+
+    python -m benchmarks.load --fleet-size 500 --latency 0.2 --error-rate 0.05
+
+Redis must be reachable at --redis-host/--redis-port, e.g. started with
+`docker run --rm -p 6379:6379 redis`. Use --flush to start with an empty cache.
+The registry of sense boxes in Redis is replaced with the fleet of the fake server.
+"""
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import os
+import socket
+from statistics import quantiles
+import subprocess
+import sys
+import time
+
+import httpx
+from redis import Redis
+
+from hive.config import settings
+from hive.opensensemap.registry import SenseBoxRegistry
+
+from .fake_opensensemap import FakeOpenSenseMap, add_arguments
+
+
+def free_port() -> int:
+    """
+    Returns a free local TCP port.
+    """
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def app_env(args, fake: FakeOpenSenseMap):
+    """
+    Returns the environment of the hive app configured to use the fake and local Redis.
+    """
+    return {
+        **os.environ,
+        "HIVE_OPEN_SENSE_MAP_API_BASE_URL": fake.base_url,
+        "HIVE_REDIS_HOST": args.redis_host,
+        "HIVE_REDIS_PORT": str(args.redis_port),
+        "WEB_CONCURRENCY": str(args.workers),
+    }
+
+
+def replace_fleet(args, fake: FakeOpenSenseMap):
+    """
+    Replaces the sense boxes in the registry with the fleet of the fake.
+    """
+    SenseBoxRegistry(
+        Redis(host=args.redis_host, port=args.redis_port),
+        key_prefix=settings.REDIS_KEY_PREFIX,
+    ).replace(fake.fleet)
+
+
+def start_app(args, fake: FakeOpenSenseMap, port: int) -> subprocess.Popen:
+    """
+    Starts the hive app with uvicorn and waits until it accepts requests.
+    """
+    # pylint: disable-next=consider-using-with
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "hive.app:app", "--port", str(port)],
+        env=app_env(args, fake),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/metrics", timeout=1)
+            return process
+        except httpx.TransportError:
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError("hive app did not start within 30 seconds")
+
+
+def run_client(url: str, deadline: float):
+    """
+    Requests url until the deadline and returns latencies and the number of errors.
+    """
+    latencies = []
+    errors = 0
+    with httpx.Client(timeout=60) as client:
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            try:
+                response = client.get(url)
+                errors += response.status_code >= 500
+            except httpx.TransportError:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+    return latencies, errors
+
+
+def run_scenario(url: str, concurrency: int, duration: float):
+    """
+    Runs `concurrency` clients against url for `duration` seconds.
+    """
+    deadline = time.monotonic() + duration
+    with ThreadPoolExecutor(concurrency) as executor:
+        results = list(
+            executor.map(lambda _: run_client(url, deadline), range(concurrency))
+        )
+    latencies = [latency for result in results for latency in result[0]]
+    errors = sum(result[1] for result in results)
+    return latencies, errors
+
+
+def report(endpoint: str, latencies, errors: int, duration: float, upstream_calls: int):
+    """
+    Prints one result line for an endpoint.
+    """
+    percentiles = quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+    print(
+        f"{endpoint:<14} {len(latencies):>8} {len(latencies) / duration:>10.1f} "
+        f"{percentiles[49] * 1000:>9.1f} {percentiles[98] * 1000:>9.1f} "
+        f"{errors:>7} {upstream_calls:>9}"
+    )
+
+
+def main():
+    """
+    Runs the load scenarios.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n", maxsplit=1)[0])
+    add_arguments(parser, latency=0.1)
+    parser.add_argument("--redis-host", default="localhost")
+    parser.add_argument("--redis-port", type=int, default=6379)
+    parser.add_argument("--flush", action="store_true", help="flush Redis first")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--endpoints", default="/temperature,/readyz")
+    args = parser.parse_args()
+
+    if args.flush:
+        Redis(host=args.redis_host, port=args.redis_port).flushdb()
+
+    fake = FakeOpenSenseMap.from_args(args).start()
+    replace_fleet(args, fake)
+    port = free_port()
+    app = start_app(args, fake, port)
+    print(
+        f"fleet size: {len(fake.fleet)}, sensors: {args.sensors}, "
+        f"upstream latency: {args.latency}s, error rate: {args.error_rate}, "
+        f"workers: {args.workers}, concurrency: {args.concurrency}"
+    )
+    print(
+        f"{'endpoint':<14} {'requests':>8} {'req/s':>10} {'p50 ms':>9} "
+        f"{'p99 ms':>9} {'errors':>7} {'upstream':>9}"
+    )
+    try:
+        for endpoint in args.endpoints.split(","):
+            fake.reset_calls()
+            latencies, errors = run_scenario(
+                f"http://127.0.0.1:{port}{endpoint}", args.concurrency, args.duration
+            )
+            report(endpoint, latencies, errors, args.duration, fake.reset_calls())
+    finally:
+        app.terminate()
+        app.wait()
+        fake.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Microbenchmarks for the OpenSenseMap hot path.
+
+Measures model parsing, the cache codec used by CachingRepository and the temperature
+aggregation for a fleet of generated sense boxes:
+
+    python -m benchmarks.micro --fleet-size 500 --sensors 20
+
+With --archive, the documents recorded in a replay archive are used instead.
+Each benchmark reports the best mean time per operation over several timeit repeats.
+"""
+import argparse
+import timeit
+from unittest.mock import Mock
+
+from hive.opensensemap.model import SenseBox
+from hive.opensensemap.recording import ReplayClient
+from hive.opensensemap.repository import CachingRepository, SenseBoxRepository
+from hive.opensensemap.service import OpenSenseMapTemperatureService
+
+from .fake_opensensemap import fake_sense_box, fleet_ids
+
+
+class DictRedis(dict):
+    """
+    In-memory stand-in for the Redis commands writing cached entities,
+    to benchmark the codec only. Commands are applied immediately when pipelined.
+    """
+
+    def hset(self, key, mapping):
+        """
+        Stores the hash fields under key.
+        """
+        self[key] = mapping
+
+    def delete(self, *_):
+        """
+        Ignored, hashes are replaced by `hset`.
+        """
+
+    def zadd(self, *_):
+        """
+        Ignored, sorted sets are not part of the codec.
+        """
+
+    def execute(self):
+        """
+        Ignored, commands are applied immediately.
+        """
+
+    def pipeline(self, **_):
+        """
+        Returns itself as pipeline.
+        """
+        return self
+
+
+def benchmark(name: str, func, number: int, repeat: int = 5):
+    """
+    Runs func `number` times per repeat and prints the best time per operation.
+    """
+    best = min(timeit.repeat(func, number=number, repeat=repeat)) / number
+    print(f"{name:<40} {best * 1e6:>12.1f} µs/op")
+    return best
+
+
+def main():
+    """
+    Runs all microbenchmarks.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n", maxsplit=1)[0])
+    parser.add_argument("--fleet-size", type=int, default=500)
+    parser.add_argument("--sensors", type=int, default=20)
+    parser.add_argument("--number", type=int, default=200)
+    parser.add_argument("--archive", help="use documents of a replay archive")
+    args = parser.parse_args()
+
+    if args.archive:
+        replay = ReplayClient.load(args.archive, speed=0)
+        documents = [replay.fetch_sense_box(i) for i in replay.sense_box_ids]
+        documents = [document for document in documents if document]
+        args.fleet_size = len(documents)
+        args.sensors = max(len(document["sensors"]) for document in documents)
+    else:
+        documents = [
+            fake_sense_box(i, args.sensors) for i in fleet_ids(args.fleet_size)
+        ]
+    sense_boxes = [SenseBox(**document) for document in documents]
+
+    redis = DictRedis()
+    cache = CachingRepository(SenseBoxRepository(None), SenseBox, redis)
+    # pylint: disable=protected-access
+    cache._cache_entity(sense_boxes[0])
+    encoded = redis[f"hive:box:{sense_boxes[0].id}"]
+
+    repository = Mock()
+    repository.find_all.return_value = sense_boxes
+    service = OpenSenseMapTemperatureService(repository)
+
+    print(f"fleet size: {args.fleet_size}, max sensors per box: {args.sensors}")
+    benchmark("parse SenseBox", lambda: SenseBox(**documents[0]), args.number * 10)
+    benchmark(
+        "cache codec encode",
+        lambda: cache._cache_entity(sense_boxes[0]),
+        args.number * 10,
+    )
+    benchmark(
+        "cache codec decode",
+        lambda: SenseBox(**cache._parse_cached_entity(encoded).entity),
+        args.number * 10,
+    )
+    benchmark(
+        f"aggregate {args.fleet_size} sense boxes",
+        service.calculate_average_temperature,
+        args.number,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Records OpenSenseMap API responses into a replay archive.
+
+Fetches the given sense boxes from the API for a number of rounds and stores every
+response with its latency using RecordingClient:
+
+    python -m benchmarks.record --ids-file boxes.txt --rounds 3 --interval 60 boxes.jsonl.gz
+
+With --synthesize, documents of a generated fleet are written instead, which requires no
+network access:
+
+    python -m benchmarks.record --synthesize --fleet-size 500 --sensors 20 boxes.jsonl.gz
+
+The archive can be replayed by the app (setting UPSTREAM_REPLAY), by the fake
+OpenSenseMap server (--archive) and by the microbenchmarks (--archive).
+"""
+import argparse
+import random
+import time
+
+from hive.config import settings
+from hive.opensensemap.client import OpenSenseMapClient
+from hive.opensensemap.recording import RecordingClient
+
+from .fake_opensensemap import fake_sense_box, fleet_ids
+
+
+# pylint: disable=too-few-public-methods
+class SyntheticClient:
+    """
+    Client returning generated sense boxes after a latency drawn from a normal distribution.
+    """
+
+    def __init__(self, sensors: int, latency: float):
+        self.sensors = sensors
+        self.latency = latency
+
+    def fetch_sense_box(self, sense_box_id):
+        """
+        Returns a generated sense box document.
+        """
+        time.sleep(max(0.0, random.gauss(self.latency, self.latency / 4)))
+        return fake_sense_box(sense_box_id, self.sensors)
+
+
+def main():
+    """
+    Records the archive.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n", maxsplit=1)[0])
+    parser.add_argument("archive", help="path of the gzip JSON lines archive")
+    parser.add_argument("--ids", default=settings.SENSE_BOX_IDS)
+    parser.add_argument("--ids-file", help="file with one sense box id per line")
+    parser.add_argument("--rounds", type=int, default=1)
+    parser.add_argument("--interval", type=float, default=0)
+    parser.add_argument("--synthesize", action="store_true")
+    parser.add_argument("--fleet-size", type=int, default=500)
+    parser.add_argument("--sensors", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.0)
+    args = parser.parse_args()
+
+    if args.synthesize:
+        delegate = SyntheticClient(args.sensors, args.latency)
+        sense_box_ids = fleet_ids(args.fleet_size)
+    else:
+        delegate = OpenSenseMapClient(settings.OPEN_SENSE_MAP_API_BASE_URL)
+        if args.ids_file:
+            with open(args.ids_file, encoding="utf-8") as ids_file:
+                sense_box_ids = [line.strip() for line in ids_file if line.strip()]
+        else:
+            sense_box_ids = [
+                sense_box_id.strip() for sense_box_id in args.ids.split(",")
+            ]
+
+    with RecordingClient(delegate, args.archive) as client:
+        for current_round in range(args.rounds):
+            if current_round:
+                time.sleep(args.interval)
+            for sense_box_id in sense_box_ids:
+                client.fetch_sense_box(sense_box_id)
+            print(
+                f"round {current_round + 1}: recorded {len(sense_box_ids)} sense boxes"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+"""
+Startup scenario for the hive app against local stand-ins.
+
+Starts a FakeOpenSenseMap server and then starts and stops the hive app (uvicorn)
+configured to use it and a local Redis several times. For each start it reports the
+time until the app first responds, the time until it first reports ready and the
+resident memory of each worker once ready and after idling:
+
+    python -m benchmarks.startup --fleet-size 500 --workers 2 --runs 5
+
+The time to ready bounds how fast a new pod takes load when the HPA scales out, the
+resident memory per worker how many workers fit into the memory limit of a pod.
+
+Redis must be reachable at --redis-host/--redis-port. By default, Redis keeps the cache
+between starts like on a scale-out; use --flush to warm up a cold cache on every start.
+Use --command to compare entrypoints, e.g. --command "poetry run uvicorn", and
+--cold-bytecode to compile all modules on every start like an image without
+precompiled bytecode. Resident memory is read from /proc, so it is reported on Linux only.
+"""
+import argparse
+import shlex
+import subprocess
+import sys
+import tempfile
+import time
+from statistics import median
+
+import httpx
+from redis import Redis
+
+from .fake_opensensemap import FakeOpenSenseMap, add_arguments
+from .load import app_env, free_port, replace_fleet
+
+
+def start_app(args, fake: FakeOpenSenseMap, port: int, pycache: str = None):
+    """
+    Starts the hive app without waiting for it, compiling all modules into the
+    empty pycache directory if given.
+    """
+    env = app_env(args, fake)
+    if pycache:
+        env.update(PYTHONDONTWRITEBYTECODE="1", PYTHONPYCACHEPREFIX=pycache)
+    # pylint: disable-next=consider-using-with
+    return subprocess.Popen(
+        [*shlex.split(args.command), "hive.app:app", "--port", str(port)],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+def wait_for(url: str, start: float, ready: bool = False, timeout: float = 120):
+    """
+    Requests url until it responds, with OK if ready is set,
+    and returns the seconds since start.
+    """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            response = httpx.get(url, timeout=1)
+            if not ready or response.status_code == 200:
+                return time.perf_counter() - start
+        except httpx.TransportError:
+            pass
+        time.sleep(0.02)
+    raise RuntimeError(f"{url} did not respond within {timeout} seconds")
+
+
+def children(pid: int):
+    """
+    Returns the ids of the child processes of the given process.
+    """
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children", encoding="ascii") as file:
+            return [int(child) for child in file.read().split()]
+    except OSError:
+        return []
+
+
+def workers(pid: int):
+    """
+    Returns the ids of the worker processes started by the given process, i.e., the
+    processes without children, except for helpers like the resource tracker.
+    """
+    if not (pids := children(pid)):
+        return [pid]
+    return [
+        worker for child in pids if not _is_helper(child) for worker in workers(child)
+    ]
+
+
+def _is_helper(pid: int) -> bool:
+    try:
+        with open(f"/proc/{pid}/cmdline", "rb") as file:
+            return b"resource_tracker" in file.read()
+    except OSError:
+        return True
+
+
+def resident_memory(pid: int) -> float:
+    """
+    Returns the resident memory of the given process in MiB, 0 if unknown.
+    """
+    try:
+        with open(f"/proc/{pid}/status", encoding="ascii") as file:
+            for line in file:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
+
+
+def run_start(args, fake: FakeOpenSenseMap):
+    """
+    Starts the app once and returns the seconds until it responds and until it is
+    ready, the largest resident memory of a worker once ready and after idling,
+    and the resident memory of all workers after idling.
+    """
+    if args.flush:
+        Redis(host=args.redis_host, port=args.redis_port).flushdb()
+        replace_fleet(args, fake)
+    port = free_port()
+    with tempfile.TemporaryDirectory() as pycache:
+        start = time.perf_counter()
+        app = start_app(args, fake, port, pycache if args.cold_bytecode else None)
+        try:
+            responding = wait_for(f"http://127.0.0.1:{port}/version", start)
+            ready = wait_for(f"http://127.0.0.1:{port}/readyz", start, ready=True)
+            pids = workers(app.pid)
+            ready_memory = [resident_memory(pid) for pid in pids]
+            time.sleep(args.idle)
+            idle_memory = [resident_memory(pid) for pid in pids]
+        finally:
+            app.terminate()
+            app.wait()
+    return (
+        responding,
+        ready,
+        max(ready_memory, default=0),
+        max(idle_memory, default=0),
+        sum(idle_memory),
+    )
+
+
+def report(run: str, result):
+    """
+    Prints one result line for a start.
+    """
+    responding, ready, ready_memory, idle_memory, total_memory = result
+    print(
+        f"{run:<8} {responding:>13.2f} {ready:>9.2f} "
+        f"{ready_memory:>12.1f} {idle_memory:>11.1f} {total_memory:>11.1f}"
+    )
+
+
+def main():
+    """
+    Runs the startup scenario.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n", maxsplit=1)[0])
+    add_arguments(parser)
+    parser.add_argument("--redis-host", default="localhost")
+    parser.add_argument("--redis-port", type=int, default=6379)
+    parser.add_argument("--flush", action="store_true", help="flush Redis every start")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument(
+        "--idle", type=float, default=5, help="seconds idle after ready"
+    )
+    parser.add_argument(
+        "--command",
+        default=f"{sys.executable} -m uvicorn",
+        help="command starting uvicorn",
+    )
+    parser.add_argument(
+        "--cold-bytecode", action="store_true", help="compile modules every start"
+    )
+    args = parser.parse_args()
+
+    fake = FakeOpenSenseMap.from_args(args).start()
+    replace_fleet(args, fake)
+    print(
+        f"fleet size: {len(fake.fleet)}, upstream latency: {args.latency}s, "
+        f"workers: {args.workers}, command: {args.command}, "
+        f"bytecode: {'cold' if args.cold_bytecode else 'cached'}"
+    )
+    print(
+        f"{'run':<8} {'responding s':>13} {'ready s':>9} "
+        f"{'ready MiB':>12} {'idle MiB':>11} {'total MiB':>11}"
+    )
+    try:
+        results = []
+        for run in range(args.runs):
+            results.append(run_start(args, fake))
+            report(str(run + 1), results[-1])
+        report("median", [median(column) for column in zip(*results)])
+    finally:
+        fake.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,130 @@
 """
 Main entrypoint of the hive app.
 """
+import asyncio
+from contextlib import asynccontextmanager
 from importlib import metadata
+import logging
+import threading
+
+from .multiprocess import setup_multiprocess_metrics
+
+# metric files of this worker are created on import, so the directory must exist first
+setup_multiprocess_metrics()
+
+# pylint: disable=wrong-import-position,wrong-import-order
 from fastapi import FastAPI
 from prometheus_fastapi_instrumentator import Instrumentator
 
+from .config import settings
+from .opensensemap.admin import router as admin_router
+from .opensensemap.di import (
+    close_recording,
+    create_refresh_scheduler,
+    get_admission_controller,
+    migrate_cache,
+    start_membership,
+    start_registry,
+    warm_up,
+)
 from .opensensemap.router import router as open_sense_map_router
+from .saturation import SaturationMonitor, admission_queue, refresher_backlog
+
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(_: FastAPI):
+    """
+    Loads the registry of sense boxes, migrates entries of the legacy cache layout
+    and warms up the cache before the app starts serving requests, so that a new pod
+    reports ready only once all active sense boxes are cached. Workers warming up
+    at the same time request each sense box once, see `CachingRepository.warm_up`.
+    Afterwards, the refresher keeps the cache up to date in the background,
+    sharing the sense boxes with the workers of all pods, and saturation metrics
+    are sampled. On shutdown, the archive of recorded API responses is closed.
+    """
+    registry = None
+    try:
+        registry = await asyncio.to_thread(start_registry)
+    except Exception:  # pylint: disable=broad-exception-caught
+        logger.exception("Loading the sense box registry failed, loading on demand")
+
+    try:
+        migrated = await asyncio.to_thread(migrate_cache)
+        if migrated:
+            logger.info("Migrated %d sense boxes to the current cache layout", migrated)
+    except Exception:  # pylint: disable=broad-exception-caught
+        logger.exception("Cache migration failed, legacy entries are refetched")
 
-app = FastAPI()
+    if settings.WARMUP_ENABLED:
+        # the warm-up thread is not stopped by the timeout, it stops requesting once set
+        cancelled = threading.Event()
+        try:
+            sense_boxes = await asyncio.wait_for(
+                asyncio.to_thread(warm_up, cancelled), settings.WARMUP_TIMEOUT
+            )
+            logger.info(
+                "Warmed up %d of %d sense boxes",
+                len(sense_boxes) - sense_boxes.count(None),
+                len(sense_boxes),
+            )
+        except asyncio.TimeoutError:
+            logger.warning(
+                "Cache warm-up timed out after %s seconds, continuing with a cold cache",
+                settings.WARMUP_TIMEOUT,
+            )
+        except Exception:  # pylint: disable=broad-exception-caught
+            logger.exception("Cache warm-up failed, continuing with a cold cache")
+        finally:
+            cancelled.set()
+
+    scheduler = membership = None
+    if settings.REFRESHER_ENABLED:
+        try:
+            membership = await asyncio.to_thread(start_membership)
+            scheduler = await asyncio.to_thread(create_refresh_scheduler)
+            scheduler.start()
+        except Exception:  # pylint: disable=broad-exception-caught
+            logger.exception("Refresher failed to start, refreshing on demand only")
+
+    monitor = SaturationMonitor(settings.SATURATION_INTERVAL)
+    monitor.add_probe(admission_queue, lambda: get_admission_controller().queued)
+    if scheduler:
+        monitor.add_probe(refresher_backlog, scheduler.backlog)
+    monitor_task = asyncio.create_task(monitor.run())
+
+    yield
+
+    monitor_task.cancel()
+    if scheduler:
+        await asyncio.to_thread(scheduler.stop)
+    if membership:
+        await asyncio.to_thread(membership.stop)
+    if registry:
+        await asyncio.to_thread(registry.stop)
+    if settings.UPSTREAM_RECORD:
+        await asyncio.to_thread(close_recording)
+
+
+app = FastAPI(lifespan=lifespan)
 app.include_router(open_sense_map_router)
+app.include_router(admin_router)
+
+Instrumentator(should_instrument_requests_inprogress=True).instrument(app).expose(app)
+
+if settings.PROFILING_ENABLED or settings.ADMIN_TOKEN:
+    # imported lazily, profiling support is not loaded unless configured
+    from .profiling import ProfilingMiddleware
 
-Instrumentator().instrument(app).expose(app)
+    app.add_middleware(
+        ProfilingMiddleware,
+        directory=settings.PROFILING_DIR,
+        token=settings.ADMIN_TOKEN,
+        always=settings.PROFILING_ENABLED,
+        interval=settings.PROFILING_INTERVAL,
+        max_traces=settings.PROFILING_MAX_TRACES,
+    )
 
 
 def version():
@@ -0,0 +1,56 @@
+"""
+Module to support Prometheus multiprocess collection.
+
+When the app runs with several uvicorn workers (see `WEB_CONCURRENCY`), every worker
+is a separate process with its own metric values. Setting `PROMETHEUS_MULTIPROC_DIR`
+makes prometheus_client write the values to files in that directory, which the
+`Instrumentator` aggregates on `/metrics` regardless of the worker that answers.
+"""
+import os
+import re
+
+from prometheus_client import multiprocess
+
+MULTIPROC_DIR_ENV = "PROMETHEUS_MULTIPROC_DIR"
+
+_PID_PATTERN = re.compile(r"_(\d+)\.db$")
+
+
+def setup_multiprocess_metrics():
+    """
+    Prepares the multiprocess directory, if configured, and removes the live gauge files
+    of workers that are no longer running.
+
+    Must be called before the first metric is created in a worker.
+    """
+    directory = os.environ.get(MULTIPROC_DIR_ENV)
+    if not directory:
+        return
+    os.makedirs(directory, exist_ok=True)
+    for pid in _dead_worker_pids(directory):
+        multiprocess.mark_process_dead(pid, directory)
+
+
+def _dead_worker_pids(directory):
+    """
+    Returns the pids of metric files in the given directory whose process is gone.
+    """
+    pids = set()
+    for filename in os.listdir(directory):
+        match = _PID_PATTERN.search(filename)
+        if match:
+            pids.add(int(match.group(1)))
+    return [pid for pid in pids if not _is_alive(pid)]
+
+
+def _is_alive(pid):
+    """
+    Returns True if a process with the given pid is running.
+    """
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
@@ -0,0 +1,135 @@
+"""
+Module for handling admin API endpoints to manage the served sense boxes.
+
+All endpoints require the admin token as bearer token and are disabled
+unless an admin token is configured.
+
+Endpoints:
+    - GET /admin/boxes: Endpoint to list the active and pending sense boxes.
+    - PUT /admin/boxes/{sense_box_id}: Endpoint to add a sense box. It is warmed up
+        in the background and counts toward the average temperature once cached.
+        Sense boxes the API does not know are removed again.
+    - DELETE /admin/boxes/{sense_box_id}: Endpoint to remove a sense box
+        and evict it from the cache.
+"""
+import hmac
+import logging
+import threading
+from typing import Annotated, Optional
+
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Response
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+
+from hive.config import settings
+from .di import get_caching_repository, get_registry
+from .registry import SenseBoxRegistry
+from .repository import CachingRepository
+from .schemas import SenseBoxesBase
+
+logger = logging.getLogger(__name__)
+
+bearer = HTTPBearer(auto_error=False)
+
+# seconds until a failed warm-up of an added sense box is retried, doubled per failure
+RETRY_AFTER = 5
+MAX_RETRY_AFTER = 300
+
+
+def require_admin(
+    credentials: Annotated[Optional[HTTPAuthorizationCredentials], Depends(bearer)]
+):
+    """
+    Rejects the request unless it carries the configured admin token.
+    """
+    if not settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=404)
+    if not credentials or not hmac.compare_digest(
+        credentials.credentials.encode(), settings.ADMIN_TOKEN.encode()
+    ):
+        raise HTTPException(status_code=401, headers={"WWW-Authenticate": "Bearer"})
+
+
+router = APIRouter(prefix="/admin", dependencies=[Depends(require_admin)])
+
+
+@router.get("/boxes")
+def read_boxes(
+    registry: Annotated[SenseBoxRegistry, Depends(get_registry)]
+) -> SenseBoxesBase:
+    """
+    GET method to list the active and pending sense boxes.
+    """
+    return SenseBoxesBase(active=list(registry.load()), pending=registry.pending())
+
+
+@router.put("/boxes/{sense_box_id}")
+def add_box(
+    sense_box_id: str,
+    background_tasks: BackgroundTasks,
+    registry: Annotated[SenseBoxRegistry, Depends(get_registry)],
+    caching_repository: Annotated[CachingRepository, Depends(get_caching_repository)],
+):
+    """
+    PUT method to add a sense box. Responds with Accepted while the sense box is
+    warmed up and with OK if the sense box is already active.
+    """
+    if not registry.add(sense_box_id):
+        return Response(status_code=200)
+    background_tasks.add_task(warm_up, sense_box_id, registry, caching_repository)
+    return Response(status_code=202)
+
+
+@router.delete("/boxes/{sense_box_id}")
+def remove_box(
+    sense_box_id: str,
+    registry: Annotated[SenseBoxRegistry, Depends(get_registry)],
+    caching_repository: Annotated[CachingRepository, Depends(get_caching_repository)],
+):
+    """
+    DELETE method to remove a sense box and evict it from the cache.
+    """
+    if not registry.remove(sense_box_id):
+        raise HTTPException(status_code=404)
+    caching_repository.evict(sense_box_id)
+    return Response(status_code=204)
+
+
+def warm_up(sense_box_id, registry, caching_repository, retry_after=RETRY_AFTER):
+    """
+    Caches the added sense box and activates it. Sense boxes the API does not know
+    are removed again. If requesting the API fails, e.g., as it is unavailable or
+    throttled, the sense box stays pending and the warm-up is retried after
+    `retry_after` seconds, doubled on every failure up to MAX_RETRY_AFTER, until it
+    succeeds or the sense box is removed.
+    """
+    if sense_box_id not in registry.pending():
+        # removed or activated meanwhile
+        return
+    try:
+        sense_box = caching_repository.load(sense_box_id)
+    except Exception as error:  # pylint: disable=broad-exception-caught
+        retry_after = max(retry_after, getattr(error, "retry_after", 0))
+        logger.warning(
+            "Warming up sense box %s failed, retrying in %.0f seconds: %r",
+            sense_box_id,
+            retry_after,
+            error,
+        )
+        retry = threading.Timer(
+            retry_after,
+            warm_up,
+            (
+                sense_box_id,
+                registry,
+                caching_repository,
+                min(retry_after * 2, MAX_RETRY_AFTER),
+            ),
+        )
+        retry.daemon = True
+        retry.start()
+        return
+    if sense_box:
+        registry.activate(sense_box_id)
+    else:
+        logger.warning("Sense box %s not found, removing it", sense_box_id)
+        registry.remove(sense_box_id)
@@ -0,0 +1,66 @@
+"""
+Module for admission control of requests served from the threadpool.
+
+This module defines the AdmissionController class, which limits the number of requests
+in flight per worker. Requests beyond the limit wait in a bounded queue; requests which
+do not fit into the queue or wait too long are not admitted and are either served from
+the cache only or rejected, see the `admission` dependency in the router module.
+
+The controller runs on the event loop before a request is handed to the threadpool, so
+a slow upstream does not let requests pile up in the threadpool.
+"""
+import asyncio
+from contextlib import asynccontextmanager
+
+
+# pylint: disable=too-few-public-methods
+class AdmissionController:
+    """
+    Admits up to `max_in_flight` concurrent requests. Up to `max_queue` further requests
+    wait up to `queue_timeout` seconds for a free slot.
+
+    `max_in_flight` should be below the threadpool size (40 by default), so that
+    requests which are not admitted still find a free thread.
+    """
+
+    def __init__(self, max_in_flight: int, max_queue: int, queue_timeout: float):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self.queued = 0
+        self._semaphore = asyncio.Semaphore(max_in_flight)
+
+    @asynccontextmanager
+    async def admit(self):
+        """
+        Waits for a free slot and holds it until the context is left.
+
+        Yields:
+            bool: True if the request was admitted, False if the queue is full
+                or the request waited longer than `queue_timeout`.
+        """
+        admitted = True
+        if not self._semaphore.locked():
+            # does not suspend, so no other request takes the slot in between
+            await self._semaphore.acquire()
+        elif self.queued >= self.max_queue:
+            admitted = False
+        else:
+            self.queued += 1
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                admitted = False
+            finally:
+                self.queued -= 1
+
+        if not admitted:
+            yield False
+            return
+        self.in_flight += 1
+        try:
+            yield True
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
@@ -2,10 +2,30 @@
 Module for handling API requests to OpenSenseMap API.
 
 This module defines the OpenSenseMapApi class, which is responsible for handling
-API requests to the OpenSenseMap API.
+API requests to the OpenSenseMap API, and the UpstreamRateLimited exception raised
+when requests are throttled.
 """
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from time import perf_counter
+
 import requests
 
+from .metrics import upstream_request_duration
+
+
+class UpstreamRateLimited(requests.HTTPError):
+    """
+    Raised if the OpenSenseMap API responds with Too Many Requests,
+    or if requests are throttled locally to avoid that.
+    """
+
+    def __init__(self, retry_after: float, *args, **kwargs):
+        super().__init__(
+            f"Rate limited, retry after {retry_after:.1f}s", *args, **kwargs
+        )
+        self.retry_after = retry_after
+
 
 # pylint: disable=too-few-public-methods
 class OpenSenseMapClient:
@@ -27,10 +47,51 @@ class OpenSenseMapClient:
             sense_box_id (str): Identifier for the Sense Box.
 
         Returns:
-            SenseBox: SenseBox instance.
+            SenseBox: SenseBox instance, None if the API does not know the sense box.
+
+        Raises:
+            UpstreamRateLimited: If the API responds with Too Many Requests.
+            requests.HTTPError: If the API responds with a server error.
         """
-        response = requests.get(f"{self.base_url}/boxes/{sense_box_id}", timeout=30)
+        start = perf_counter()
+        try:
+            response = requests.get(f"{self.base_url}/boxes/{sense_box_id}", timeout=30)
+        except requests.RequestException:
+            upstream_request_duration.labels(status_code="error").observe(
+                perf_counter() - start
+            )
+            raise
+        upstream_request_duration.labels(status_code=response.status_code).observe(
+            perf_counter() - start
+        )
+        if response.status_code == 429:
+            raise UpstreamRateLimited(
+                _retry_after(response.headers.get("Retry-After")), response=response
+            )
+        if response.status_code >= 500:
+            raise requests.HTTPError(
+                f"Server error {response.status_code}", response=response
+            )
         data = None
         if response.status_code == 200:
             data = response.json()
         return data
+
+
+def _retry_after(value, default: float = 60):
+    """
+    Parses the Retry-After header, given in seconds or as HTTP date.
+    """
+    if not value:
+        return default
+    try:
+        return max(float(value), 0)
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return default
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0)
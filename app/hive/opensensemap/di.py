@@ -5,62 +5,330 @@ This module initializes and configures the various components of the OpenSenseMa
 repository, and service.
 
 Components:
-    - client: Instance of OpenSenseMapClient for handling API requests.
-    - redis: Instance of Redis to cache entities.
+    - client: Instance of OpenSenseMapClient for handling API requests,
+      rate limited over all pods if configured.
+    - admission: Whether the request was admitted by the AdmissionController.
+    - redis: Instance of Redis (or RedisCluster) to cache entities, connected to the primary.
+    - redis_replica: Instance of Redis (or RedisCluster) for cache reads from replicas,
+      if configured.
+    - membership: Instance of Membership to share refreshes between workers, one per
+      process.
+    - registry: Instance of SenseBoxRegistry holding the ids of all sense boxes,
+      one per process.
+    - snapshot: Instance of SnapshotStore as local cache tier, if configured.
     - caching_repository: Instance of CachingRepository to cache OpenSenseMapRepository results.
     - repository: Instance of OpenSenseMapRepository for interaction with the API and database.
     - service: Instance of OpenSenseMapTemperatureService for calculating average temperatures.
     - availability_service: Instance of OpenSenseMapAvailabilityService for requesting availability
 
-Configuration:
+Configuration (settings):
     - OPEN_SENSE_MAP_API_BASE_URL (str): Base URL for the OpenSenseMap API.
+    - UPSTREAM_RECORD (str): Archive path to record API responses to, disabled if empty.
+      Each process records into its own archive with its process id added to the name.
+    - UPSTREAM_REPLAY (str): Archive path to replay API responses from instead of
+      requesting the API, disabled if empty.
+    - UPSTREAM_REPLAY_SPEED (float): Replay speed factor, 0 replays without delay.
+    - UPSTREAM_RATE_LIMIT (float): Requests per second to the API over all pods,
+      unlimited if 0 (default).
+    - UPSTREAM_RATE_BURST (int): Requests to the API allowed in a burst.
+    - UPSTREAM_RATE_MAX_WAIT (float): Seconds a request waits for the rate limiter.
+    - ADMISSION_MAX_IN_FLIGHT, ADMISSION_MAX_QUEUE (int): Requests in flight and waiting
+      per worker, see AdmissionController.
+    - ADMISSION_QUEUE_TIMEOUT (float): Seconds a request waits to be admitted.
+    - ADMISSION_OVERLOAD (str): "stale" to serve requests which are not admitted from
+      the cache only, "reject" to respond with Service Unavailable.
+    - REDIS_MODE (str): "standalone", "sentinel" or "cluster".
+    - REDIS_HOST, REDIS_PORT: Address of the Redis server in standalone mode,
+      of a startup node in cluster mode.
+    - REDIS_SENTINELS (str): Comma-separated host:port addresses of the sentinels.
+    - REDIS_SENTINEL_MASTER (str): Name of the master monitored by the sentinels.
+    - REDIS_READ_FROM_REPLICAS (bool): Read cached entities from replicas. Writes
+      and locks always go to the primary.
+    - REDIS_REPLICA_HOST, REDIS_REPLICA_PORT: Address of the replicas in standalone
+      mode, e.g., a service in front of all replicas.
+    - REDIS_KEY_PREFIX (str): Namespace of all Redis keys of the cache. A hash tag
+      like "{hive}" keeps all keys in one cluster slot, so batch operations work
+      in cluster mode.
+    - SENSE_BOX_IDS (str): Comma-separated ids the registry is seeded with on first start.
+      Afterwards, sense boxes are added and removed via the admin endpoints.
+    - REGISTRY_RELOAD_INTERVAL (int): Seconds between reloads of the registry, in case
+      change notifications were missed.
+    - SNAPSHOT_DIR (str): Directory of the local snapshot tier, disabled if empty.
+    - WARMUP_CONCURRENCY (int): Number of sense boxes fetched concurrently on warm-up.
+    - REFRESH_ADAPTIVE (bool): Schedule refreshes based on the report interval of each
+      sense box instead of a fixed interval of REFRESH_DEFAULT_INTERVAL seconds.
+    - REFRESH_DEFAULT_INTERVAL, REFRESH_MIN_INTERVAL, REFRESH_MAX_INTERVAL,
+      REFRESH_GRACE (int): Refresh intervals in seconds, see RefreshPolicy.
+    - REFRESH_JITTER (float): Jitter of refreshes as fraction of the report interval.
+    - REFRESH_PROBE_AFTER (int): Successive refreshes finding a new measurement after
+      which a refresh probes for a shorter report interval.
+    - REFRESH_SHARDED (bool): Refresh each sense box by exactly one worker of all pods,
+      assigned by consistent hashing over the live members, instead of by every worker.
+    - MEMBERSHIP_HEARTBEAT_INTERVAL, MEMBERSHIP_TIMEOUT (int): Seconds between heartbeats
+      of a member and until a member without heartbeat is considered gone.
 """
+from datetime import timedelta
+from functools import lru_cache
+import os
 from typing import Annotated
-from fastapi import Depends
-from redis import Redis
+from fastapi import Depends, HTTPException
+from redis import Redis, RedisCluster
+from redis.sentinel import Sentinel
 
 from hive.config import settings
 from .model import SenseBox
+from .admission import AdmissionController
 from .client import OpenSenseMapClient
+from .membership import Membership
+from .registry import SenseBoxRegistry
 from .repository import SenseBoxRepository, CachingRepository
+from .scheduler import RefreshPolicy, RefreshScheduler
+from .snapshot import SnapshotStore
 from .service import OpenSenseMapTemperatureService, OpenSenseMapAvailabilityService
 
-OPEN_SENSE_MAP_API_BASE_URL = "https://api.opensensemap.org"
-
 
 def get_redis():
     """
-    Creates Redis instance.
+    Returns Redis instance connected to the primary.
+    """
+    return _create_redis(settings.REDIS_MODE)
+
+
+def get_redis_replica():
+    """
+    Returns Redis instance for reads from replicas if configured, None otherwise.
+    """
+    if not settings.REDIS_READ_FROM_REPLICAS:
+        return None
+    return _create_redis(settings.REDIS_MODE, replica=True)
+
+
+@lru_cache
+def _create_redis(mode, replica=False):
+    """
+    Creates the Redis instance once per process, sharing its connection pool
+    between requests.
     """
+    if mode == "sentinel":
+        sentinel = Sentinel(
+            [_address(sentinel) for sentinel in settings.REDIS_SENTINELS.split(",")]
+        )
+        if replica:
+            return sentinel.slave_for(settings.REDIS_SENTINEL_MASTER)
+        return sentinel.master_for(settings.REDIS_SENTINEL_MASTER)
+    if mode == "cluster":
+        return RedisCluster(
+            host=settings.REDIS_HOST,
+            port=settings.REDIS_PORT,
+            read_from_replicas=replica,
+        )
+    if mode != "standalone":
+        raise ValueError(f"Unknown Redis mode: {mode}")
+    if replica:
+        return Redis(host=settings.REDIS_REPLICA_HOST, port=settings.REDIS_REPLICA_PORT)
     return Redis(host=settings.REDIS_HOST, port=settings.REDIS_PORT)
 
 
-def get_client():
+def _address(address):
+    """
+    Parses a host:port address.
+    """
+    host, port = address.strip().rsplit(":", 1)
+    return host, int(port)
+
+
+def get_client(redis: Annotated[Redis, Depends(get_redis)]):
     """
     Creates OpenSenseMapClient instance.
+    Depending on configuration, the client records or replays API responses
+    and is rate limited.
+    """
+    # imported lazily, recording, replay and rate limiting are not loaded unless configured
+    # pylint: disable=import-outside-toplevel
+    if settings.UPSTREAM_REPLAY:
+        return _get_replay_client(
+            settings.UPSTREAM_REPLAY, settings.UPSTREAM_REPLAY_SPEED
+        )
+    client = OpenSenseMapClient(settings.OPEN_SENSE_MAP_API_BASE_URL)
+    if settings.UPSTREAM_RECORD:
+        client = _get_recording_client(
+            settings.OPEN_SENSE_MAP_API_BASE_URL, settings.UPSTREAM_RECORD
+        )
+    if settings.UPSTREAM_RATE_LIMIT:
+        from .ratelimit import RateLimitedClient
+
+        client = RateLimitedClient(
+            client, _get_token_bucket(redis), settings.UPSTREAM_RATE_MAX_WAIT
+        )
+    return client
+
+
+@lru_cache
+def _get_token_bucket(redis):
+    """
+    Creates the TokenBucket of the upstream once per process (and Redis instance).
     """
-    return OpenSenseMapClient(OPEN_SENSE_MAP_API_BASE_URL)
+    from .ratelimit import TokenBucket  # pylint: disable=import-outside-toplevel
+
+    return TokenBucket(
+        redis,
+        f"{settings.REDIS_KEY_PREFIX}:ratelimit:upstream",
+        rate=settings.UPSTREAM_RATE_LIMIT,
+        capacity=settings.UPSTREAM_RATE_BURST,
+    )
+
+
+@lru_cache
+def _get_recording_client(base_url, path):
+    """
+    Creates the RecordingClient once per process, so that all requests append to
+    the same recording session. Each process records into its own archive, named
+    after the given path with the process id, e.g., `boxes-1234.jsonl.gz`.
+    """
+    from .recording import RecordingClient  # pylint: disable=import-outside-toplevel
+
+    directory, filename = os.path.split(path)
+    name, dot, extensions = filename.partition(".")
+    return RecordingClient(
+        OpenSenseMapClient(base_url),
+        os.path.join(directory, f"{name}-{os.getpid()}{dot}{extensions}"),
+    )
 
 
-def get_repository(client: Annotated[OpenSenseMapClient, Depends(get_client)]):
+def close_recording():
     """
-    Creates SenseBoxRepository instance.
+    Closes the archive of the RecordingClient of this process, if one was created.
+    """
+    if settings.UPSTREAM_RECORD and _get_recording_client.cache_info().currsize:
+        _get_recording_client(
+            settings.OPEN_SENSE_MAP_API_BASE_URL, settings.UPSTREAM_RECORD
+        ).close()
+
+
+@lru_cache
+def _get_replay_client(path, speed):
+    """
+    Loads the replay archive once per process.
+    """
+    from .recording import ReplayClient  # pylint: disable=import-outside-toplevel
+
+    return ReplayClient.load(path, speed)
+
+
+def get_registry(redis: Annotated[Redis, Depends(get_redis)]):
+    """
+    Returns the SenseBoxRegistry instance of the given Redis instance.
+    """
+    return _get_registry(redis)
+
+
+@lru_cache
+def _get_registry(redis):
+    """
+    Creates the SenseBoxRegistry once per process (and Redis instance).
+    """
+    return SenseBoxRegistry(
+        redis,
+        key_prefix=settings.REDIS_KEY_PREFIX,
+        seed=[
+            sense_box_id.strip() for sense_box_id in settings.SENSE_BOX_IDS.split(",")
+        ],
+        reload_interval=settings.REGISTRY_RELOAD_INTERVAL,
+    )
+
+
+def get_repository(
+    client: Annotated[OpenSenseMapClient, Depends(get_client)],
+    registry: Annotated[SenseBoxRegistry, Depends(get_registry)],
+):
+    """
+    Creates SenseBoxRepository instance for all active sense boxes.
     """
     repository = SenseBoxRepository(client)
-    repository.sense_box_ids = [
-        sense_box_id.strip() for sense_box_id in settings.SENSE_BOX_IDS.split(",")
-    ]
+    repository.sense_box_ids = registry.sense_box_ids
     return repository
 
 
+def get_snapshot():
+    """
+    Returns SnapshotStore instance if a snapshot directory is configured.
+    """
+    if settings.SNAPSHOT_DIR:
+        return _get_snapshot_store(settings.SNAPSHOT_DIR)
+    return None
+
+
+@lru_cache
+def _get_snapshot_store(directory):
+    """
+    Creates the SnapshotStore once per process.
+    """
+    return SnapshotStore(directory)
+
+
+@lru_cache
+def get_refresh_policy():
+    """
+    Creates RefreshPolicy instance if adaptive refreshes are configured.
+    """
+    if not settings.REFRESH_ADAPTIVE:
+        return None
+    return RefreshPolicy(
+        timedelta(seconds=settings.REFRESH_DEFAULT_INTERVAL),
+        min_interval=timedelta(seconds=settings.REFRESH_MIN_INTERVAL),
+        max_interval=timedelta(seconds=settings.REFRESH_MAX_INTERVAL),
+        grace=timedelta(seconds=settings.REFRESH_GRACE),
+        jitter=settings.REFRESH_JITTER,
+        probe_after=settings.REFRESH_PROBE_AFTER,
+    )
+
+
 def get_caching_repository(
     delegate: Annotated[SenseBoxRepository, Depends(get_repository)],
     redis: Annotated[Redis, Depends(get_redis)],
+    redis_replica: Annotated[Redis, Depends(get_redis_replica)],
+    snapshot: Annotated[SnapshotStore, Depends(get_snapshot)],
+    refresh_policy: Annotated[RefreshPolicy, Depends(get_refresh_policy)],
 ):
     """
     Creates CachingRepository instance.
     """
-    return CachingRepository(delegate, SenseBox, redis)
+    return CachingRepository(
+        delegate,
+        SenseBox,
+        redis,
+        timedelta(seconds=settings.REFRESH_DEFAULT_INTERVAL),
+        replica=redis_replica,
+        snapshot=snapshot,
+        refresh_policy=refresh_policy,
+        key_prefix=settings.REDIS_KEY_PREFIX,
+    )
+
+
+@lru_cache
+def get_admission_controller():
+    """
+    Creates the AdmissionController once per process.
+    """
+    return AdmissionController(
+        settings.ADMISSION_MAX_IN_FLIGHT,
+        settings.ADMISSION_MAX_QUEUE,
+        settings.ADMISSION_QUEUE_TIMEOUT,
+    )
+
+
+async def get_admission(
+    controller: Annotated[AdmissionController, Depends(get_admission_controller)],
+):
+    """
+    Admits the request for its duration, see AdmissionController.
+    Requests which are not admitted are rejected with Service Unavailable,
+    unless they are to be served from the cache only.
+    """
+    async with controller.admit() as admitted:
+        if not admitted and settings.ADMISSION_OVERLOAD != "stale":
+            raise HTTPException(status_code=503, headers={"Retry-After": "1"})
+        yield admitted
 
 
 def get_service(
@@ -80,3 +348,97 @@ def get_availability_service(
     Creates OpenSenseMapAvailabilityService instance.
     """
     return OpenSenseMapAvailabilityService(repository, caching_repository)
+
+
+def migrate_cache():
+    """
+    Moves entities cached with the legacy key layout into the current one,
+    see `CachingRepository.migrate_legacy_keys`.
+    """
+    return _create_caching_repository().migrate_legacy_keys()
+
+
+def warm_up(cancelled=None):
+    """
+    Fills the cache with all active sense boxes, see `CachingRepository.warm_up`.
+    """
+    return _create_caching_repository().warm_up(settings.WARMUP_CONCURRENCY, cancelled)
+
+
+def start_registry():
+    """
+    Loads the registry and starts listening for changes of the sense boxes.
+    """
+    registry = get_registry(get_redis())
+    registry.load()
+    return registry.start()
+
+
+@lru_cache
+def get_membership():
+    """
+    Returns the Membership instance of this process if refreshes are sharded,
+    None otherwise.
+    """
+    if not settings.REFRESH_SHARDED:
+        return None
+    return Membership(
+        get_redis(),
+        key_prefix=settings.REDIS_KEY_PREFIX,
+        heartbeat_interval=settings.MEMBERSHIP_HEARTBEAT_INTERVAL,
+        timeout=settings.MEMBERSHIP_TIMEOUT,
+    )
+
+
+def start_membership():
+    """
+    Joins the group of workers sharing the refresh of sense boxes, if sharded.
+    """
+    membership = get_membership()
+    return membership.start() if membership else None
+
+
+def create_refresh_scheduler():
+    """
+    Creates a RefreshScheduler for all active sense boxes owned by this process,
+    scheduled according to their cached refresh times.
+    Sense boxes are scheduled or unscheduled whenever sense boxes are added to or
+    removed from the registry, or ownership moves as members join or leave.
+    """
+    caching_repository = _create_caching_repository()
+    registry = get_registry(get_redis())
+    membership = get_membership()
+    scheduler = RefreshScheduler(caching_repository.refresh)
+
+    def reconcile(*_):
+        owned = {
+            sense_box_id
+            for sense_box_id in registry.sense_box_ids
+            if membership is None or membership.owns(sense_box_id)
+        }
+        scheduled = scheduler.entity_ids()
+        for sense_box_id in scheduled - owned:
+            scheduler.unschedule(sense_box_id)
+        for sense_box_id, refresh_at in caching_repository.refresh_schedule(
+            sorted(owned - scheduled)
+        ):
+            scheduler.schedule(sense_box_id, refresh_at)
+
+    reconcile()
+    registry.add_listener(reconcile)
+    if membership:
+        membership.add_listener(reconcile)
+    return scheduler
+
+
+def _create_caching_repository():
+    """
+    Creates CachingRepository instance outside of request handling.
+    """
+    return get_caching_repository(
+        get_repository(get_client(get_redis()), get_registry(get_redis())),
+        get_redis(),
+        get_redis_replica(),
+        get_snapshot(),
+        get_refresh_policy(),
+    )
@@ -0,0 +1,159 @@
+"""
+Module for sharding the refresh of sense boxes between all workers of all pods.
+
+This module defines
+    - the HashRing class, a consistent hash ring assigning each entity to exactly one
+      member, so that only a small share of entities moves when members join or leave.
+    - the Membership class, which keeps the list of live members in a Redis sorted set
+      by sending heartbeats in a background thread, and rebuilds the ring whenever
+      members join, leave or stop sending heartbeats.
+"""
+from bisect import bisect
+import hashlib
+import logging
+import os
+import socket
+import threading
+
+from redis import Redis
+from redis.exceptions import RedisError
+
+logger = logging.getLogger(__name__)
+
+# KEYS[1]: sorted set of members scored by the time of their latest heartbeat
+# ARGV[1]: member id, ARGV[2]: seconds without heartbeat until a member is removed
+# Returns the ids of all live members.
+HEARTBEAT = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+redis.call('ZADD', KEYS[1], now, ARGV[1])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - tonumber(ARGV[2]))
+return redis.call('ZRANGE', KEYS[1], 0, -1)
+"""
+
+
+def _hash(key: str) -> int:
+    """
+    Stable 64 bit hash of key, identical in all processes.
+    """
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+
+
+# pylint: disable=too-few-public-methods
+class HashRing:
+    """
+    Consistent hash ring with `replicas` virtual nodes per member.
+    """
+
+    def __init__(self, members=(), replicas: int = 64):
+        self.members = tuple(sorted(members))
+        self._ring = sorted(
+            (_hash(f"{member}#{replica}"), member)
+            for member in self.members
+            for replica in range(replicas)
+        )
+        self._hashes = [point for point, _ in self._ring]
+
+    def owner(self, key: str):
+        """
+        Returns the member owning the given key, None if there are no members.
+        """
+        if not self._ring:
+            return None
+        index = bisect(self._hashes, _hash(key)) % len(self._ring)
+        return self._ring[index][1]
+
+
+# pylint: disable=too-many-instance-attributes
+class Membership:
+    """
+    Membership of this process in the group of workers sharing the refresh of entities.
+
+    Each member adds itself with the time of its latest heartbeat to `<prefix>:members`
+    every `heartbeat_interval`, members without heartbeat for `timeout` are removed.
+    Time is taken from Redis, so clocks of pods do not need to be in sync.
+    Listeners registered with `add_listener` are called with the new ring whenever
+    the members change.
+    """
+
+    # pylint: disable=too-many-arguments
+    def __init__(
+        self,
+        redis: Redis,
+        *,
+        key_prefix: str = "hive",
+        member_id: str = None,
+        heartbeat_interval: float = 5,
+        timeout: float = 15,
+    ):
+        self.redis = redis
+        self.key_prefix = key_prefix
+        self.member_id = member_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.heartbeat_interval = heartbeat_interval
+        self.timeout = timeout
+        self.ring = HashRing([self.member_id])
+        self._listeners = []
+        self._heartbeat = redis.register_script(HEARTBEAT)
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def owns(self, entity_id) -> bool:
+        """
+        Returns True if this member is the owner of the given entity.
+        """
+        return self.ring.owner(entity_id) == self.member_id
+
+    def add_listener(self, listener):
+        """
+        Registers a function called with the new ring whenever the members change.
+        """
+        self._listeners.append(listener)
+
+    def heartbeat(self):
+        """
+        Announces this member, removes members without heartbeat
+        and rebuilds the ring if the members changed.
+        """
+        members = {
+            _decode(member)
+            for member in self._heartbeat(
+                keys=[self._key_members()], args=[self.member_id, self.timeout]
+            )
+        }
+        if members != set(self.ring.members):
+            logger.info("Members changed: %d members", len(members))
+            self.ring = HashRing(members)
+            for listener in self._listeners:
+                listener(self.ring)
+        return self.ring
+
+    def start(self):
+        """
+        Joins the group and sends heartbeats in a background thread.
+        """
+        self.heartbeat()
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        Stops sending heartbeats and leaves the group, so that other members
+        take over its entities with their next heartbeat.
+        """
+        self._stopped.set()
+        self._thread.join()
+        self.redis.zrem(self._key_members(), self.member_id)
+
+    def _run(self):
+        while not self._stopped.wait(self.heartbeat_interval):
+            try:
+                self.heartbeat()
+            except RedisError:
+                logger.exception("Heartbeat of %s failed", self.member_id)
+
+    def _key_members(self):
+        return f"{self.key_prefix}:members"
+
+
+def _decode(value):
+    return value.decode() if isinstance(value, bytes) else value
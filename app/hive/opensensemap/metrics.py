@@ -0,0 +1,86 @@
+"""
+Module defining Prometheus metrics for the OpenSenseMap hot path.
+
+All metrics are registered in the default registry and are therefore exposed by the
+`Instrumentator` on `/metrics`. Label values are restricted to small, fixed sets
+(HTTP status codes, Redis commands, cache tiers, model names) to keep cardinality bounded;
+sense box ids are deliberately never used as label values.
+"""
+from prometheus_client import Counter, Histogram
+
+NAMESPACE = "opensensemap"
+
+FAST_BUCKETS = (
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+)
+
+upstream_request_duration = Histogram(
+    "upstream_request_duration_seconds",
+    "Latency of requests to the OpenSenseMap API by response status code",
+    ["status_code"],
+    namespace=NAMESPACE,
+)
+
+upstream_rate_limited = Counter(
+    "upstream_rate_limited",
+    "Requests to the OpenSenseMap API rejected by the shared rate limiter (local) "
+    "or by the API with Too Many Requests (upstream)",
+    ["source"],
+    namespace=NAMESPACE,
+)
+
+redis_command_duration = Histogram(
+    "redis_command_duration_seconds",
+    "Latency of Redis round trips by command",
+    ["command"],
+    namespace=NAMESPACE,
+    buckets=FAST_BUCKETS,
+)
+
+cache_lookups = Counter(
+    "cache_lookups",
+    "Cache lookups by tier and result (hit, miss, stale)",
+    ["tier", "result"],
+    namespace=NAMESPACE,
+)
+
+cache_refresh_lag = Histogram(
+    "cache_refresh_lag_seconds",
+    "Time between a cached sense box becoming due and its refresh from upstream",
+    namespace=NAMESPACE,
+    buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600),
+)
+
+cache_refreshes = Counter(
+    "cache_refreshes",
+    "Refreshes from upstream by result (updated, unchanged, missing, failed)",
+    ["result"],
+    namespace=NAMESPACE,
+)
+
+model_parse_duration = Histogram(
+    "model_parse_duration_seconds",
+    "Time spent validating documents into pydantic models by model",
+    ["model"],
+    namespace=NAMESPACE,
+    buckets=FAST_BUCKETS,
+)
+
+aggregation_duration = Histogram(
+    "aggregation_duration_seconds",
+    "Time spent aggregating sense boxes into the average temperature",
+    namespace=NAMESPACE,
+    buckets=FAST_BUCKETS,
+)
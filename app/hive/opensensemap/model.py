@@ -1,7 +1,7 @@
 """
 Module to define common models used when interacting with OpenSenseMap.
 """
-from typing import Annotated, List
+from typing import Annotated, List, Optional
 from datetime import datetime
 
 from pydantic import BaseModel, ConfigDict, Field
@@ -44,11 +44,29 @@ class SenseBox(BaseModel):
     name: str
     sensors: List[Sensor]
 
+    @property
+    def last_measured_at(self) -> Optional[datetime]:
+        """
+        Returns the creation time of the latest measurement of all sensors.
+        """
+        return max(
+            (sensor.last_measurement.created_at for sensor in self.sensors),
+            default=None,
+        )
+
 
 class CachedEntity(BaseModel):
     """
     Represents a cached entity.
+
+    Besides the entity, the time of its latest measurement, the learned interval
+    between measurements, the number of successive refreshes which found a new
+    measurement and the time of the next refresh are cached.
     """
 
     last_modified: datetime
     entity: dict
+    measured_at: Optional[datetime] = None
+    report_interval: Optional[float] = None
+    updates: Optional[int] = None
+    refresh_at: Optional[datetime] = None
@@ -0,0 +1,140 @@
+"""
+Module for limiting the rate of requests to the OpenSenseMap API over all pods.
+
+This module defines
+    - the TokenBucket class, a token bucket shared by all workers of all pods, which is
+      refilled and taken from atomically by a Lua script in Redis.
+    - the RateLimitedClient class, which delegates to an OpenSenseMapClient once a token
+      is available, and blocks all requests for the Retry-After time of a Too Many
+      Requests response.
+
+RateLimitedClient provides the `fetch_sense_box` method of OpenSenseMapClient and can be
+used in its place, see `get_client` in the di module.
+"""
+import time
+
+from redis import Redis
+
+from .client import OpenSenseMapClient, UpstreamRateLimited
+from .metrics import upstream_rate_limited
+
+# KEYS[1]: hash with the tokens and the time of the last refill
+# KEYS[2]: key existing while requests are blocked after Too Many Requests
+# ARGV[1]: tokens per second, ARGV[2]: capacity
+# Returns 0 if a token was taken, the milliseconds until the next token otherwise.
+TAKE_TOKEN = """
+local blocked = redis.call('PTTL', KEYS[2])
+if blocked > 0 then
+    return blocked
+end
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+local rate = tonumber(ARGV[1]) / 1000
+local capacity = tonumber(ARGV[2])
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'refilled_at')
+local tokens = tonumber(bucket[1]) or capacity
+local refilled_at = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - refilled_at) * rate)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = math.ceil((1 - tokens) / rate)
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'refilled_at', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate) + 1000)
+return wait
+"""
+
+
+class TokenBucket:
+    """
+    Token bucket holding up to `capacity` tokens, refilled by `rate` tokens per second.
+
+    The bucket is stored in Redis under `key`, hence shared by all clients of the same
+    Redis. Time is taken from Redis, so clocks of pods do not need to be in sync.
+    """
+
+    def __init__(self, redis: Redis, key: str, *, rate: float, capacity: int):
+        self.redis = redis
+        self.key = key
+        self.rate = rate
+        self.capacity = capacity
+        self._take_token = redis.register_script(TAKE_TOKEN)
+
+    def take(self) -> float:
+        """
+        Takes a token if available.
+
+        Returns:
+            float: 0 if a token was taken, the seconds until the next token otherwise.
+        """
+        wait = self._take_token(
+            keys=[self.key, self._key_blocked()], args=[self.rate, self.capacity]
+        )
+        return int(wait) / 1000
+
+    def acquire(self, max_wait: float) -> float:
+        """
+        Takes a token, waiting up to `max_wait` seconds for one.
+
+        Returns:
+            float: 0 if a token was taken, the seconds until the next token otherwise.
+        """
+        deadline = time.monotonic() + max_wait
+        while (wait := self.take()) > 0:
+            if time.monotonic() + wait > deadline:
+                return wait
+            time.sleep(wait)
+        return 0
+
+    def block(self, seconds: float):
+        """
+        Blocks taking tokens for the given seconds.
+        """
+        if seconds > 0:
+            self.redis.set(self._key_blocked(), 1, px=int(seconds * 1000))
+
+    def _key_blocked(self):
+        return f"{self.key}:blocked"
+
+
+# pylint: disable=too-few-public-methods
+class RateLimitedClient:
+    """
+    Client which limits the rate of requests of the delegated OpenSenseMapClient.
+
+    Requests wait up to `max_wait` seconds for a token of the bucket and raise
+    UpstreamRateLimited if none becomes available in time.
+    """
+
+    def __init__(
+        self, delegate: OpenSenseMapClient, bucket: TokenBucket, max_wait: float = 5
+    ):
+        self.delegate = delegate
+        self.bucket = bucket
+        self.max_wait = max_wait
+
+    def fetch_sense_box(self, sense_box_id):
+        """
+        Fetches sense box from the delegate once a token is available.
+
+        Args:
+            sense_box_id (str): Identifier for the Sense Box.
+
+        Returns:
+            dict: Sense box document, None if not found.
+
+        Raises:
+            UpstreamRateLimited: If no token became available in time or
+                the API responds with Too Many Requests.
+        """
+        if wait := self.bucket.acquire(self.max_wait):
+            upstream_rate_limited.labels(source="local").inc()
+            raise UpstreamRateLimited(wait)
+        try:
+            return self.delegate.fetch_sense_box(sense_box_id)
+        except UpstreamRateLimited as error:
+            upstream_rate_limited.labels(source="upstream").inc()
+            self.bucket.block(error.retry_after)
+            raise
@@ -0,0 +1,136 @@
+"""
+Module to record and replay OpenSenseMap API responses.
+
+This module defines
+    - the RecordingClient class, which delegates to an OpenSenseMapClient and appends every
+      response including its latency to a gzip-compressed JSON lines archive.
+    - the ReplayClient class, which serves the responses of such an archive
+      in recorded order, either at recorded or at accelerated speed.
+
+Both classes provide the `fetch_sense_box` method of OpenSenseMapClient and can be used
+in its place, see `get_client` in the di module.
+"""
+from collections import defaultdict
+import gzip
+import json
+import threading
+import time
+
+from .client import OpenSenseMapClient
+
+
+# pylint: disable=too-few-public-methods
+class RecordingClient:
+    """
+    Client which records responses of the delegated OpenSenseMapClient.
+
+    The archive is kept open as a single gzip stream until `close` is called, which
+    compresses far better than a gzip member per response. An archive which was not
+    closed, e.g., as the process was killed, can still be replayed up to the
+    last compressed block.
+    """
+
+    def __init__(self, delegate: OpenSenseMapClient, path: str):
+        self.delegate = delegate
+        self.path = path
+        self._archive = gzip.open(path, "at", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def fetch_sense_box(self, sense_box_id):
+        """
+        Fetches sense box from the delegate and records the response.
+
+        Args:
+            sense_box_id (str): Identifier for the Sense Box.
+
+        Returns:
+            dict: Sense box document, None if not found.
+        """
+        start = time.monotonic()
+        data = self.delegate.fetch_sense_box(sense_box_id)
+        record = {
+            "sense_box_id": sense_box_id,
+            "duration": round(time.monotonic() - start, 6),
+            "data": data,
+        }
+        line = json.dumps(record, separators=(",", ":")) + "\n"
+        with self._lock:
+            if not self._archive.closed:
+                self._archive.write(line)
+        return data
+
+    def close(self):
+        """
+        Writes all buffered responses and closes the archive.
+        Responses fetched afterwards are not recorded.
+        """
+        with self._lock:
+            self._archive.close()
+
+
+class ReplayClient:
+    """
+    Client which replays responses of an archive written by RecordingClient.
+
+    Responses are returned per sense box in recorded order, starting over once all
+    responses of a sense box have been replayed. Each response is delayed by its
+    recorded duration divided by `speed`; a speed of 0 replays without any delay.
+    """
+
+    def __init__(self, records, speed: float = 1.0):
+        self.speed = speed
+        self.records = defaultdict(list)
+        for record in records:
+            self.records[record["sense_box_id"]].append(record)
+        self._cursors = defaultdict(int)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path: str, speed: float = 1.0):
+        """
+        Creates a ReplayClient from the archive at the given path.
+        Archives which were not closed are read up to the last complete response.
+        """
+        records = []
+        with gzip.open(path, "rt", encoding="utf-8") as archive:
+            try:
+                for line in archive:
+                    if line.strip() and line.endswith("\n"):
+                        records.append(json.loads(line))
+            except EOFError:
+                pass
+        return cls(records, speed)
+
+    @property
+    def sense_box_ids(self):
+        """
+        Returns the ids of all recorded sense boxes.
+        """
+        return list(self.records)
+
+    def fetch_sense_box(self, sense_box_id):
+        """
+        Returns the next recorded response for the given sense box.
+
+        Args:
+            sense_box_id (str): Identifier for the Sense Box.
+
+        Returns:
+            dict: Sense box document, None if not recorded or recorded as not found.
+        """
+        records = self.records.get(sense_box_id)
+        if not records:
+            return None
+        with self._lock:
+            cursor = self._cursors[sense_box_id]
+            self._cursors[sense_box_id] = (cursor + 1) % len(records)
+        record = records[cursor]
+        if self.speed:
+            time.sleep(record["duration"] / self.speed)
+        return record["data"]
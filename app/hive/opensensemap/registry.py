@@ -0,0 +1,214 @@
+"""
+Module for the registry of sense boxes served by the app.
+
+This module defines the SenseBoxRegistry class, which stores the ids of all sense boxes
+in Redis, so that boxes can be added and removed at runtime without a redeployment, and
+keeps a parsed copy of them in memory in every worker.
+
+Keys (all prefixed with the cache key prefix):
+    - `<prefix>:boxes`: set of the ids of all active sense boxes.
+    - `<prefix>:boxes:pending`: set of the ids of added sense boxes which are warmed up
+      and not yet active.
+    - `<prefix>:boxes:seeded`: marker that the registry was seeded from configuration.
+
+Every change is published on the `<prefix>:boxes` channel. Each worker listens on it
+in a background thread and reloads the ids, and reloads them periodically in case
+messages were missed.
+"""
+import logging
+import threading
+import time
+from typing import Iterable
+
+from redis import Redis
+from redis.exceptions import RedisError
+
+logger = logging.getLogger(__name__)
+
+
+# pylint: disable=too-many-instance-attributes
+class SenseBoxRegistry:
+    """
+    Registry of the ids of active and pending sense boxes.
+
+    Requests only read the in-memory ids, Redis is accessed on changes and reloads.
+    Listeners registered with `add_listener` are called with the sets of added and
+    removed active ids whenever the ids change.
+    """
+
+    def __init__(
+        self,
+        redis: Redis,
+        *,
+        key_prefix: str = "hive",
+        seed: Iterable[str] = (),
+        reload_interval: float = 60,
+    ):
+        self.redis = redis
+        self.key_prefix = key_prefix
+        self.seed = [sense_box_id for sense_box_id in seed if sense_box_id]
+        self.reload_interval = reload_interval
+        self._ids = None
+        self._id_set = frozenset()
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    @property
+    def sense_box_ids(self):
+        """
+        Returns the ids of all active sense boxes, sorted.
+        Loaded from Redis on first access.
+        """
+        if self._ids is None:
+            self.load()
+        return self._ids
+
+    def __contains__(self, sense_box_id):
+        if self._ids is None:
+            self.load()
+        return sense_box_id in self._id_set
+
+    def pending(self):
+        """
+        Returns the ids of all sense boxes added but not yet active, sorted.
+        """
+        return sorted(
+            _decode(member) for member in self.redis.smembers(self._key_pending())
+        )
+
+    def add_listener(self, listener):
+        """
+        Registers a function called with the added and removed ids on every change.
+        """
+        self._listeners.append(listener)
+
+    def load(self):
+        """
+        Loads the ids of all active sense boxes from Redis. On first start, the
+        registry is seeded with the configured ids.
+        """
+        if self.seed and self.redis.set(self._key_seeded(), 1, nx=True):
+            self.redis.sadd(self._key_active(), *self.seed)
+        ids = frozenset(
+            _decode(member) for member in self.redis.smembers(self._key_active())
+        )
+        with self._lock:
+            previous, self._id_set, self._ids = self._id_set, ids, tuple(sorted(ids))
+        added, removed = ids - previous, previous - ids
+        if added or removed:
+            logger.info(
+                "Sense boxes changed: %d added, %d removed", len(added), len(removed)
+            )
+            for listener in self._listeners:
+                listener(added, removed)
+        return self._ids
+
+    def add(self, sense_box_id):
+        """
+        Adds the sense box as pending, it becomes active with `activate`.
+
+        Returns:
+            bool: False if the sense box is already active.
+        """
+        if sense_box_id in self:
+            return False
+        self.redis.sadd(self._key_pending(), sense_box_id)
+        return True
+
+    def activate(self, sense_box_id):
+        """
+        Moves the pending sense box to the active ones and notifies all workers.
+        """
+        if self.redis.smove(self._key_pending(), self._key_active(), sense_box_id):
+            self._publish()
+
+    def remove(self, sense_box_id):
+        """
+        Removes the sense box, whether active or pending, and notifies all workers.
+
+        Returns:
+            bool: False if the sense box was not registered.
+        """
+        pipeline = self.redis.pipeline()
+        pipeline.srem(self._key_active(), sense_box_id)
+        pipeline.srem(self._key_pending(), sense_box_id)
+        removed = any(pipeline.execute())
+        if removed:
+            self._publish()
+        return removed
+
+    def replace(self, sense_box_ids: Iterable[str]):
+        """
+        Replaces all active sense boxes with the given ones, without warm-up.
+
+        Only the difference is removed and added instead of recreating the set,
+        so that workers reloading concurrently never see it empty, even in cluster
+        mode where pipelines are not transactional.
+        """
+        sense_box_ids = set(sense_box_ids)
+        removed = {
+            _decode(member) for member in self.redis.smembers(self._key_active())
+        } - sense_box_ids
+        pipeline = self.redis.pipeline()
+        if removed:
+            pipeline.srem(self._key_active(), *removed)
+        if sense_box_ids:
+            pipeline.sadd(self._key_active(), *sense_box_ids)
+        pipeline.delete(self._key_pending())
+        pipeline.set(self._key_seeded(), 1)
+        pipeline.execute()
+        self._publish()
+
+    def start(self):
+        """
+        Starts listening for changes in a background thread.
+        """
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        Stops listening for changes.
+        """
+        self._stopped.set()
+        self._thread.join()
+
+    def _publish(self):
+        self.redis.publish(self._key_active(), "changed")
+        self.load()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                self._listen()
+            except RedisError:
+                logger.exception("Listening for sense box changes failed, retrying")
+                self._stopped.wait(1)
+
+    def _listen(self):
+        """
+        Reloads the ids on every published change and every `reload_interval` seconds.
+        """
+        with self.redis.pubsub(ignore_subscribe_messages=True) as pubsub:
+            pubsub.subscribe(self._key_active())
+            reload_at = time.monotonic() + self.reload_interval
+            while not self._stopped.is_set():
+                message = pubsub.get_message(timeout=1.0)
+                if message or time.monotonic() >= reload_at:
+                    self.load()
+                    reload_at = time.monotonic() + self.reload_interval
+
+    def _key_active(self):
+        return f"{self.key_prefix}:boxes"
+
+    def _key_pending(self):
+        return f"{self.key_prefix}:boxes:pending"
+
+    def _key_seeded(self):
+        return f"{self.key_prefix}:boxes:seeded"
+
+
+def _decode(value):
+    return value.decode() if isinstance(value, bytes) else value
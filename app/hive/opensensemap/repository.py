@@ -5,16 +5,28 @@ This module defines
     - the SenseBoxRepository class, which serves as a repository to
       interact with both the OpenSenseMap API.
     - the CachingRepository class, which caches results of repository
-      delegate into a Redis cache.
+      delegate into a Redis cache, optionally backed by a local snapshot tier.
 """
-from typing import Type, TypeVar
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Type, TypeVar
 from datetime import datetime, timezone, timedelta
 import json
+import threading
 
 from redis import Redis
+from requests import RequestException
 
-from .client import OpenSenseMapClient
+from .client import OpenSenseMapClient, UpstreamRateLimited
+from .metrics import (
+    cache_lookups,
+    cache_refresh_lag,
+    cache_refreshes,
+    model_parse_duration,
+    redis_command_duration,
+)
 from .model import CachedEntity, SenseBox
+from .scheduler import RefreshPolicy
+from .snapshot import SnapshotStore
 
 
 class SenseBoxRepository:
@@ -29,8 +41,16 @@ class SenseBoxRepository:
     def find_all(self):
         """
         Find all sense boxes based on given sense box ids.
+        Sense boxes which cannot be requested, e.g., as the API is throttled,
+        are None like sense boxes which are not found.
         """
-        return [self.find(sense_box_id) for sense_box_id in self.sense_box_ids]
+        return [self._find_or_none(sense_box_id) for sense_box_id in self.sense_box_ids]
+
+    def _find_or_none(self, sense_box_id):
+        try:
+            return self.find(sense_box_id)
+        except RequestException:
+            return None
 
     def find(self, sense_box_id):
         """
@@ -38,100 +58,494 @@ class SenseBoxRepository:
         """
         data = self.client.fetch_sense_box(sense_box_id)
         if data:
-            data = SenseBox(**data)
+            with model_parse_duration.labels(model=SenseBox.__name__).time():
+                data = SenseBox(**data)
         return data
 
 
+# pylint: disable=too-many-instance-attributes
 class CachingRepository:
     """
     Decorator repository to cache results of the delegated repository in Redis.
+
+    All keys share the `key_prefix` namespace. Each entity is stored in a hash
+    `<prefix>:box:<id>`, and the sorted sets `<prefix>:last_modified` and
+    `<prefix>:refresh_at` index all cached entities by the time they were cached and
+    the time they are due for refresh, so freshness checks never parse entities.
+
+    If a replica is given, cached entities and freshness are read from it, while writes
+    and the checks preceding a refresh go to the primary `redis`. Reads lagging
+    behind the primary at most cause an early refresh.
+
+    If a snapshot store is given, cached entities are also written to it. Entities
+    missing in Redis, e.g., after a Redis flush, are then served from the snapshot
+    and copied back into Redis.
+
+    Cached entities are refreshed after `refresh_after` unless a refresh policy is given,
+    which schedules refreshes based on the observed report interval of each entity.
+    Scheduled refreshes take a lease on the entity for `refresh_lease`, so an entity is
+    not refreshed twice while its owner changes between workers.
     """
 
     T = TypeVar("T")
 
+    # pylint: disable=too-many-arguments
     def __init__(
         self,
         delegate: SenseBoxRepository,
         entity_type: Type[T],
         redis: Redis,
         refresh_after: timedelta = timedelta(minutes=5),
+        *,
+        snapshot: Optional[SnapshotStore] = None,
+        refresh_policy: Optional[RefreshPolicy] = None,
+        replica: Optional[Redis] = None,
+        key_prefix: str = "hive",
+        refresh_lease: timedelta = timedelta(seconds=30),
     ):
         self.delegate = delegate
         self.entity_type = entity_type
         self.redis = redis
+        self.replica = replica or redis
         self.refresh_after = refresh_after
+        self.snapshot = snapshot
+        self.refresh_policy = refresh_policy
+        self.key_prefix = key_prefix
+        self.refresh_lease = refresh_lease
 
-    def find_all(self):
-        """
-        Finds all results. First, Redis cache is checked.
-        If there is not current result, then delegates `find_all` method is invoked.
-        The result is then cached / saved.
+    def find_all(self, refresh: bool = True):
         """
-        cache_key = self._cache_key_find_all()
-        cache = self.redis.get(cache_key)
+        Finds all results for the entity ids of the delegate.
+        The cached entities are fetched from Redis in a single round trip,
+        missing or stale entities are then requested from the delegate.
 
-        if cache:
-            entity_ids = json.loads(cache)
-            data = [self.find(entity_id) for entity_id in entity_ids]
-        else:
-            data = self.delegate.find_all()
-            entity_ids = [self._cache_entity(entity) for entity in data]
-            self.redis.set(
-                cache_key, json.dumps(entity_ids), ex=timedelta(minutes=30).seconds
+        Args:
+            refresh (bool): If False, only cached entities are returned, stale or not,
+                and the delegate is not requested.
+        """
+        entity_ids = list(self.delegate.sense_box_ids)
+        return [
+            self._resolve(entity_id, cache, tier, refresh)
+            for entity_id, (cache, tier) in zip(
+                entity_ids, self._lookup_all(entity_ids)
             )
+        ]
 
-        return data
+    def warm_up(
+        self, max_workers: int = 16, cancelled: Optional[threading.Event] = None
+    ):
+        """
+        Finds all entity ids of the delegate concurrently to fill the cache.
+        Only entities which are neither in Redis nor in the snapshot, or which are
+        stale, are requested from the delegate, and only by the worker taking their
+        refresh lease, so that workers warming up at the same time share the requests.
+        Entities leased by another worker are returned as cached, None if missing.
+
+        Args:
+            max_workers (int): Number of entities requested concurrently.
+            cancelled (threading.Event): Once set, no further entities are requested,
+                e.g., as the warm-up timed out.
+
+        Returns:
+            list: Entities found.
+        """
+
+        def resolve(entity_id, lookup):
+            cache, tier = lookup
+            if cancelled and cancelled.is_set():
+                refresh = False
+            else:
+                # stale entities are leased by _resolve, missing ones here
+                refresh = cache is not None or self._acquire_lease(entity_id)
+            return self._resolve(entity_id, cache, tier, refresh)
+
+        entity_ids = list(self.delegate.sense_box_ids)
+        lookups = self._lookup_all(entity_ids)
+        with ThreadPoolExecutor(max_workers) as executor:
+            return list(executor.map(resolve, entity_ids, lookups))
 
     def find(self, entity_id):
         """
         Finds result based on given id.
         Results are cached in Redis.
         """
-        cache = self.redis.get(entity_id)
-        should_recompute = True
+        return self._resolve(entity_id, *self._lookup(entity_id))
 
-        if cache:
-            cache = CachedEntity(**json.loads(cache))
-            entity = self.entity_type(**cache.entity)
-            should_recompute = (
-                cache.last_modified < datetime.now(timezone.utc) - self.refresh_after
-            )
+    def load(self, entity_id):
+        """
+        Requests the entity for the given id from the delegate and caches it.
+        Unlike `find`, the cache is not read and failures are not hidden.
 
-        if should_recompute:
-            entity = self.delegate.find(entity_id)
-            if entity:
-                self._cache_entity(entity)
+        Returns:
+            Entity, None if the delegate does not know it.
 
+        Raises:
+            RequestException: If requesting the delegate fails, e.g., as it is throttled.
+        """
+        entity, _ = self._recompute(entity_id, None)
         return entity
 
-    def _cache_entity(self, entity):
+    def refresh(self, entity_id):
+        """
+        Refreshes the entity for the given id from the delegate if it is due.
+        Used by the RefreshScheduler.
+
+        Returns:
+            datetime: Time of the next refresh, None if the entity was not found
+                or requesting the delegate failed.
+        """
+        with redis_command_duration.labels(command="zscore").time():
+            score = self.redis.zscore(self._key_refresh_at(), entity_id)
+        if score is not None and score > datetime.now(timezone.utc).timestamp():
+            # already refreshed by another worker or request
+            return _from_score(score)
+        if not self._acquire_lease(entity_id):
+            # being refreshed by another worker
+            return datetime.now(timezone.utc) + self.refresh_lease
+        cache = self._parse_cached_entity(self._hgetall(entity_id))
+        try:
+            _, cache = self._recompute(entity_id, cache)
+        except UpstreamRateLimited as error:
+            cache_refreshes.labels(result="failed").inc()
+            return datetime.now(timezone.utc) + timedelta(seconds=error.retry_after)
+        except RequestException:
+            # upstream failed, retried by the scheduler
+            cache_refreshes.labels(result="failed").inc()
+            return None
+        return cache.refresh_at if cache else None
+
+    def refresh_schedule(self, entity_ids=None):
         """
-        Stores the entity in Redis cache.
+        Returns the next refresh time of the given entity ids,
+        by default of all entity ids of the delegate.
+        Entities which are not cached are due immediately.
+        """
+        now = datetime.now(timezone.utc)
+        due = dict(self._zrangebyscore(self._key_refresh_at()))
+        if entity_ids is None:
+            entity_ids = self.delegate.sense_box_ids
+        return [
+            (entity_id, _from_score(due[entity_id]) if entity_id in due else now)
+            for entity_id in entity_ids
+        ]
+
+    def refresh_at(self, cache: CachedEntity):
+        """
+        Returns the time the given cached entity is due for refresh.
+        """
+        return cache.refresh_at or cache.last_modified + self.refresh_after
+
+    def last_modified_all(self, since: Optional[datetime] = None):
+        """
+        Returns the last_modified timestamp of all entites stored in Redis,
+        optionally only of those modified after `since`.
+        """
+        return [
+            _from_score(score)
+            for _, score in self._zrangebyscore(self._key_last_modified(), since)
+        ]
+
+    def count(self, entity_ids=None, since: Optional[datetime] = None) -> int:
+        """
+        Returns the number of the given entity ids, by default of all entity ids of
+        the delegate, which are stored in Redis, optionally only of those modified
+        after `since`. Entities which are stored but no longer requested, e.g.,
+        removed sense boxes, are not counted.
+        """
+        if entity_ids is None:
+            entity_ids = self.delegate.sense_box_ids
+        entity_ids = list(entity_ids)
+        if not entity_ids:
+            return 0
+        minimum = since.timestamp() if since else float("-inf")
+        with redis_command_duration.labels(command="zmscore").time():
+            scores = self.replica.zmscore(self._key_last_modified(), entity_ids)
+        return sum(1 for score in scores if score is not None and score >= minimum)
+
+    def last_modified(self, entity_id):
+        """
+        Returns the last_modified timestamp of the entity for the given id.
+        """
+        with redis_command_duration.labels(command="zscore").time():
+            score = self.replica.zscore(self._key_last_modified(), entity_id)
+        return _from_score(score) if score is not None else None
+
+    def evict(self, entity_id):
+        """
+        Removes the entity for the given id from Redis and the snapshot.
+        """
+        pipeline = self.redis.pipeline()
+        pipeline.delete(self._key_entity(entity_id))
+        pipeline.zrem(self._key_last_modified(), entity_id)
+        pipeline.zrem(self._key_refresh_at(), entity_id)
+        with redis_command_duration.labels(command="pipeline").time():
+            pipeline.execute()
+        if self.snapshot:
+            self.snapshot.delete(entity_id)
+
+    def migrate_legacy_keys(self):
+        """
+        Moves entities cached with the previous layout, one JSON string per bare
+        entity id next to a `<DelegateQualname>_find_all` list of ids, into the
+        namespaced layout and deletes the legacy keys.
+        Entities already stored in the namespaced layout are kept.
+
+        Returns:
+            int: Number of migrated entities.
+        """
+        index_key = type(self.delegate).__qualname__ + "_find_all"
+        entity_ids = set(self.delegate.sense_box_ids)
+        index = self.redis.get(index_key)
+        if index:
+            entity_ids.update(json.loads(index))
+        entity_ids = sorted(entity_ids)
+
+        pipeline = self.redis.pipeline(transaction=False)
+        for entity_id in entity_ids:
+            pipeline.type(entity_id)
+            pipeline.exists(self._key_entity(entity_id))
+        replies = pipeline.execute()
+
+        migrated = 0
+        for entity_id, key_type, exists in zip(entity_ids, replies[::2], replies[1::2]):
+            if key_type not in (b"string", "string"):
+                continue
+            if not exists:
+                data = self.redis.get(entity_id)
+                with model_parse_duration.labels(model=CachedEntity.__name__).time():
+                    cache = CachedEntity(**json.loads(data))
+                self._store(entity_id, cache)
+                migrated += 1
+            self.redis.delete(entity_id)
+        self.redis.delete(index_key)
+        return migrated
+
+    def _resolve(self, entity_id, cache: Optional[CachedEntity], tier, refresh=True):
         """
+        Returns the entity of the given lookup result,
+        requested from the delegate if it is missing or stale and `refresh` is set.
+        Missing entities are None if requesting the delegate fails, e.g., as it is
+        throttled. Stale entities are returned if requesting the delegate fails or if
+        another worker holds the refresh lease, e.g., the owner refreshing it right now,
+        so that each stale entity is requested once over all workers, not per request.
+        """
+        if not cache:
+            if not refresh:
+                return None
+            try:
+                entity, _ = self._recompute(entity_id, None)
+            except RequestException:
+                # upstream failed or is throttled, the entity is unavailable
+                cache_refreshes.labels(result="failed").inc()
+                return None
+            return entity
+
+        with model_parse_duration.labels(model=self.entity_type.__name__).time():
+            entity = self.entity_type(**cache.entity)
+        should_recompute = self.refresh_at(cache) <= datetime.now(timezone.utc)
+        cache_lookups.labels(
+            tier=tier, result="stale" if should_recompute else "hit"
+        ).inc()
+        if should_recompute and refresh and self._acquire_lease(entity_id):
+            try:
+                entity, _ = self._recompute(entity_id, cache)
+            except RequestException:
+                # upstream failed or is throttled, serve the stale entity
+                cache_refreshes.labels(result="failed").inc()
+        return entity
+
+    def _recompute(self, entity_id, previous: Optional[CachedEntity]):
+        """
+        Requests the entity from the delegate and caches it.
+
+        Returns:
+            tuple: entity and CachedEntity, both None if not found.
+        """
+        if previous:
+            lag = datetime.now(timezone.utc) - self.refresh_at(previous)
+            cache_refresh_lag.observe(max(lag.total_seconds(), 0))
+        entity = self.delegate.find(entity_id)
+        if not entity:
+            cache_refreshes.labels(result="missing").inc()
+            return None, None
+        cache = self._cache_entity(entity, previous)
+        cache_refreshes.labels(result="updated" if cache.updates else "unchanged").inc()
+        return entity, cache
+
+    def _cache_entity(self, entity, previous: Optional[CachedEntity] = None):
+        """
+        Stores the entity in Redis cache together with its next refresh time
+        and the number of successive refreshes which found a new measurement.
+        """
+        now = datetime.now(timezone.utc)
+        measured_at = getattr(entity, "last_measured_at", None)
+        updated = (
+            previous is None
+            or previous.measured_at is None
+            or measured_at is None
+            or measured_at > previous.measured_at
+        )
+        updates = (previous.updates or 0) + 1 if previous and updated else int(updated)
+        report_interval = None
+        if self.refresh_policy:
+            refresh_at, report_interval = self.refresh_policy.next_refresh(
+                measured_at,
+                previous.measured_at if previous else None,
+                previous.report_interval if previous else None,
+                now,
+                updates=updates,
+            )
+        else:
+            refresh_at = now + self.refresh_after
         cache = CachedEntity(
-            last_modified=datetime.now(timezone.utc),
+            last_modified=now,
             entity=entity.model_dump(),
+            measured_at=measured_at,
+            report_interval=report_interval,
+            updates=updates,
+            refresh_at=refresh_at,
         )
-        self.redis.set(entity.id, json.dumps(cache.model_dump(), default=str))
-        return entity.id
+        self._store(entity.id, cache)
+        if self.snapshot:
+            self.snapshot.put(entity.id, cache.model_dump_json())
+        return cache
 
-    def last_modified_all(self):
+    def _store(self, entity_id, cache: CachedEntity):
         """
-        Returns the last_modified timestamp of all entites stored in Redis.
+        Replaces all fields of the hash of the entity with a single HSET, so that
+        readers never see the hash missing or partially written, and updates both
+        sorted sets. Missing optional fields are stored as empty strings.
+
+        In standalone and sentinel mode, the sorted sets are updated in the same
+        transaction. Pipelines of RedisCluster are not transactional, so in cluster
+        mode the sorted sets may briefly lag behind the hash.
         """
-        cache_key = self._cache_key_find_all()
-        data = self.redis.get(cache_key)
-        if data:
-            entity_ids = json.loads(data)
-            return [self.last_modified(entity_id) for entity_id in entity_ids]
-        return []
+        fields = cache.model_dump(mode="json")
+        fields["entity"] = json.dumps(fields["entity"])
+        fields = {
+            name: "" if value is None else value for name, value in fields.items()
+        }
+        pipeline = self.redis.pipeline()
+        pipeline.hset(self._key_entity(entity_id), mapping=fields)
+        pipeline.zadd(
+            self._key_last_modified(), {entity_id: cache.last_modified.timestamp()}
+        )
+        pipeline.zadd(
+            self._key_refresh_at(), {entity_id: self.refresh_at(cache).timestamp()}
+        )
+        with redis_command_duration.labels(command="pipeline").time():
+            pipeline.execute()
 
-    def last_modified(self, entity_id):
+    def _acquire_lease(self, entity_id):
         """
-        Returns the last_modified timestamp of the entity for the given id.
+        Takes the refresh lease of the entity on the primary.
+        The lease is not released but expires, as the refresh time of the entity
+        is moved ahead by the refresh anyway.
+
+        Returns:
+            bool: False if another worker holds the lease.
+        """
+        with redis_command_duration.labels(command="set").time():
+            return bool(
+                self.redis.set(
+                    f"{self.key_prefix}:lease:{entity_id}",
+                    1,
+                    nx=True,
+                    px=int(self.refresh_lease.total_seconds() * 1000),
+                )
+            )
+
+    def _lookup(self, entity_id):
+        """
+        Returns the cached entity for the given id and the tier it was found in.
         """
-        data = self.redis.get(entity_id)
-        return CachedEntity(**json.loads(data)).last_modified if data else None
+        return self._lookup_all([entity_id])[0]
+
+    def _lookup_all(self, entity_ids):
+        """
+        Returns the cached entity and the tier it was found in for each of the given
+        ids, fetched from Redis in a single round trip. Entities only found in
+        the snapshot are copied back into Redis.
+        """
+        pipeline = self.replica.pipeline(transaction=False)
+        for entity_id in entity_ids:
+            pipeline.hgetall(self._key_entity(entity_id))
+        with redis_command_duration.labels(command="pipeline").time():
+            replies = pipeline.execute() if entity_ids else []
+
+        lookups = []
+        for entity_id, fields in zip(entity_ids, replies):
+            cache = self._parse_cached_entity(fields)
+            if cache:
+                lookups.append((cache, "redis"))
+                continue
+            cache_lookups.labels(tier="redis", result="miss").inc()
+            lookups.append(self._lookup_snapshot(entity_id))
+        return lookups
+
+    def _lookup_snapshot(self, entity_id):
+        """
+        Returns the cached entity for the given id from the snapshot and copies
+        it back into Redis.
+        """
+        data = self.snapshot.get(entity_id) if self.snapshot else None
+        if not data:
+            if self.snapshot:
+                cache_lookups.labels(tier="snapshot", result="miss").inc()
+            return None, None
+        with model_parse_duration.labels(model=CachedEntity.__name__).time():
+            cache = CachedEntity(**json.loads(data))
+        self._store(entity_id, cache)
+        return cache, "snapshot"
+
+    def _parse_cached_entity(self, fields):
+        """
+        Parses the hash fields of an entity into a CachedEntity, None if empty.
+        """
+        if not fields:
+            return None
+        fields = {
+            _decode(name): _decode(value)
+            for name, value in fields.items()
+            if value not in (b"", "")
+        }
+        fields["entity"] = json.loads(fields["entity"])
+        with model_parse_duration.labels(model=CachedEntity.__name__).time():
+            return CachedEntity(**fields)
+
+    def _hgetall(self, entity_id):
+        """
+        Timed Redis HGETALL of the hash of the entity.
+        """
+        with redis_command_duration.labels(command="hgetall").time():
+            return self.redis.hgetall(self._key_entity(entity_id))
+
+    def _zrangebyscore(self, key, since: Optional[datetime] = None):
+        """
+        Timed Redis ZRANGEBYSCORE returning (member, score) tuples with a score
+        of at least `since`.
+        """
+        minimum = since.timestamp() if since else "-inf"
+        with redis_command_duration.labels(command="zrangebyscore").time():
+            members = self.replica.zrangebyscore(key, minimum, "+inf", withscores=True)
+        return [(_decode(member), score) for member, score in members]
+
+    def _key_entity(self, entity_id):
+        return f"{self.key_prefix}:box:{entity_id}"
+
+    def _key_last_modified(self):
+        return f"{self.key_prefix}:last_modified"
+
+    def _key_refresh_at(self):
+        return f"{self.key_prefix}:refresh_at"
+
+
+def _from_score(score):
+    """
+    Converts a sorted set score in epoch seconds into a datetime.
+    """
+    return datetime.fromtimestamp(score, timezone.utc)
+
 
-    def _cache_key_find_all(self):
-        return type(self.delegate).__qualname__ + "_find_all"
+def _decode(value):
+    return value.decode() if isinstance(value, bytes) else value
@@ -13,7 +13,7 @@ from typing import Annotated
 from fastapi import APIRouter, Depends, Response
 from prometheus_client import Gauge
 
-from .di import get_service, get_availability_service
+from .di import get_admission, get_service, get_availability_service
 from .service import OpenSenseMapTemperatureService, OpenSenseMapAvailabilityService
 from .schemas import TemperatureBase
 
@@ -22,20 +22,29 @@ temperature_metric = Gauge(
     "temperature_average",
     "Average temperature emitted by OpenSenseMap sensors",
     namespace="opensensemap",
+    multiprocess_mode="livemostrecent",
 )
 
 
 @router.get("/temperature")
 def read_temperature(
-    service: Annotated[OpenSenseMapTemperatureService, Depends(get_service)]
+    # dependencies are resolved in order, admission runs on the event loop before
+    # the sync dependencies of the service are handed to the threadpool
+    admitted: Annotated[bool, Depends(get_admission)],
+    service: Annotated[OpenSenseMapTemperatureService, Depends(get_service)],
+    response: Response,
 ) -> TemperatureBase:
     """
     GET method to calculate and return the average temperature of sense box sensors.
+    Under overload, the temperature is calculated from cached sense boxes only,
+    marked by the `X-Hive-Stale` header.
 
     Returns:
         TemperatureBase: object containing "status" and "temperature" keys.
     """
-    result = service.get_temperature()
+    result = service.get_temperature(stale=not admitted)
+    if not admitted:
+        response.headers["X-Hive-Stale"] = "true"
     temperature_metric.set(result.temperature)
     return result
 
@@ -48,7 +57,7 @@ def head_readyz(
 ):
     """
     Readiness probe that returns an OK response unless
-    - 50% + 1 sensors are not accessible AND
+    - 50% + 1 sensors are not cached AND
     - caching content does not expire within 5 minutes.
 
     Returns:
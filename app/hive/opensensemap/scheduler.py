@@ -0,0 +1,209 @@
+"""
+Module for scheduling cache refreshes based on the report cadence of sense boxes.
+
+This module defines
+    - the RefreshPolicy class, which learns the interval between measurements of an
+      entity from successive measurement times and derives the time of its next refresh.
+    - the RefreshScheduler class, which refreshes entities in a background thread
+      whenever they become due, using a priority queue ordered by refresh time.
+"""
+from datetime import datetime, timedelta, timezone
+import heapq
+import logging
+import random
+import threading
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+# pylint: disable=too-few-public-methods
+class RefreshPolicy:
+    """
+    Policy to compute the next refresh time of a cached entity.
+
+    The report interval is an exponentially weighted moving average of the time between
+    successive measurements. The next refresh is scheduled shortly after the next
+    expected measurement, with random jitter to spread refreshes over time. As long as
+    no interval is known, entities are refreshed after `default_interval`.
+
+    Refreshes never observe measurements closer together than the refreshes themselves,
+    so once `probe_after` successive refreshes all found a new measurement, the entity
+    may report more often than learned. The next refresh then probes after half the
+    interval: if it finds a new measurement, the shorter time between measurements
+    lowers the interval, otherwise the interval is kept and the probe costs one refresh.
+    """
+
+    # pylint: disable=too-many-arguments
+    def __init__(
+        self,
+        default_interval: timedelta = timedelta(minutes=5),
+        *,
+        min_interval: timedelta = timedelta(minutes=1),
+        max_interval: timedelta = timedelta(hours=1),
+        grace: timedelta = timedelta(seconds=15),
+        jitter: float = 0.1,
+        smoothing: float = 0.5,
+        probe_after: int = 4,
+    ):
+        self.default_interval = default_interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.grace = grace
+        self.jitter = jitter
+        self.smoothing = smoothing
+        self.probe_after = probe_after
+
+    def next_refresh(
+        self,
+        measured_at: Optional[datetime],
+        previous_measured_at: Optional[datetime] = None,
+        previous_interval: Optional[float] = None,
+        now: Optional[datetime] = None,
+        *,
+        updates: int = 0,
+    ):
+        """
+        Returns the next refresh time and the learned report interval in seconds.
+
+        Args:
+            measured_at (datetime): Time of the latest measurement of the entity.
+            previous_measured_at (datetime): Time of the latest measurement
+                when the entity was cached before.
+            previous_interval (float): Report interval learned before.
+            now (datetime): Current time.
+            updates (int): Number of successive refreshes up to this one
+                which found a new measurement.
+
+        Returns:
+            tuple: refresh time (datetime) and report interval (float or None).
+        """
+        now = now or datetime.now(timezone.utc)
+        interval = previous_interval
+        if measured_at and previous_measured_at and measured_at > previous_measured_at:
+            observed = (measured_at - previous_measured_at).total_seconds()
+            interval = (
+                observed
+                if interval is None
+                else self.smoothing * observed + (1 - self.smoothing) * interval
+            )
+
+        if interval is None or measured_at is None:
+            return now + self.default_interval, interval
+
+        interval_td = timedelta(seconds=interval)
+        expected_after = interval_td
+        if updates >= self.probe_after:
+            # every refresh found a new measurement, probe for a shorter interval
+            expected_after = interval_td / 2
+        refresh_at = measured_at + expected_after + self.grace
+        if refresh_at <= now:
+            # the expected measurement is overdue, retry in a fraction of the interval
+            refresh_at = now + interval_td / 4
+        refresh_at += interval_td * random.uniform(0, self.jitter)
+        refresh_at = min(
+            max(refresh_at, now + self.min_interval), now + self.max_interval
+        )
+        return refresh_at, interval
+
+
+class RefreshScheduler:
+    """
+    Background scheduler refreshing entities when they become due.
+
+    `refresh` is called with an entity id and returns the next refresh time of that
+    entity, or None to retry after `retry_after`.
+    """
+
+    def __init__(self, refresh, retry_after: timedelta = timedelta(minutes=1)):
+        self.refresh = refresh
+        self.retry_after = retry_after
+        self._queue = []
+        self._due = {}
+        self._condition = threading.Condition()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def schedule(self, entity_id, refresh_at: datetime):
+        """
+        Schedules (or reschedules) the refresh of the given entity.
+        """
+        with self._condition:
+            self._due[entity_id] = refresh_at
+            heapq.heappush(self._queue, (refresh_at, entity_id))
+            self._condition.notify()
+
+    def unschedule(self, entity_id):
+        """
+        Removes the given entity from the schedule.
+        """
+        with self._condition:
+            self._due.pop(entity_id, None)
+
+    def entity_ids(self):
+        """
+        Returns the ids of all scheduled entities.
+        """
+        with self._condition:
+            return set(self._due)
+
+    def backlog(self, now: Optional[datetime] = None) -> int:
+        """
+        Returns the number of entities which are due but not yet refreshed.
+        """
+        now = now or datetime.now(timezone.utc)
+        with self._condition:
+            return sum(1 for refresh_at in self._due.values() if refresh_at <= now)
+
+    def start(self):
+        """
+        Starts refreshing in a background thread.
+        """
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        Stops refreshing and waits for the background thread to finish.
+        """
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+        self._thread.join()
+
+    def _next_due(self):
+        """
+        Waits until the next entity is due and returns its id, None once stopped.
+        """
+        with self._condition:
+            while not self._stopped:
+                if not self._queue:
+                    self._condition.wait()
+                    continue
+                refresh_at, entity_id = self._queue[0]
+                if self._due.get(entity_id) != refresh_at:
+                    # superseded by a later schedule call or unscheduled
+                    heapq.heappop(self._queue)
+                    continue
+                delay = (refresh_at - datetime.now(timezone.utc)).total_seconds()
+                if delay > 0:
+                    self._condition.wait(delay)
+                    continue
+                heapq.heappop(self._queue)
+                return entity_id
+            return None
+
+    def _run(self):
+        while (entity_id := self._next_due()) is not None:
+            try:
+                refresh_at = self.refresh(entity_id)
+            except Exception:  # pylint: disable=broad-exception-caught
+                logger.exception("Refreshing %s failed", entity_id)
+                refresh_at = None
+            with self._condition:
+                if entity_id not in self._due:
+                    continue
+            self.schedule(
+                entity_id,
+                refresh_at or datetime.now(timezone.utc) + self.retry_after,
+            )
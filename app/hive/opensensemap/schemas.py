@@ -24,3 +24,12 @@ class TemperatureBase(BaseModel):
 
     status: TemperatureStatus
     temperature: FiniteFloat
+
+
+class SenseBoxesBase(BaseModel):
+    """
+    Pydantic model for representing the registered sense boxes.
+    """
+
+    active: list[str]
+    pending: list[str]
@@ -12,6 +12,7 @@ functionality to request whether sensors and caching content are available.
 from datetime import datetime, timedelta, timezone
 from statistics import mean
 
+from .metrics import aggregation_duration
 from .schemas import TemperatureBase, TemperatureStatus
 
 
@@ -26,14 +27,17 @@ class OpenSenseMapTemperatureService:
     def __init__(self, repository):
         self.repository = repository
 
-    def get_temperature(self) -> TemperatureBase:
+    def get_temperature(self, stale: bool = False) -> TemperatureBase:
         """
         Returns the current average temperature and corresponding status message.
 
+        Args:
+            stale (bool): Calculate from cached sense boxes only, even if stale.
+
         Returns:
           TemperatureBase: status message and temperature
         """
-        avg_temperature = self.calculate_average_temperature()
+        avg_temperature = self.calculate_average_temperature(stale)
         status = self.temperature_status(avg_temperature)
         return TemperatureBase(status=status, temperature=avg_temperature)
 
@@ -56,33 +60,43 @@ class OpenSenseMapTemperatureService:
             status = TemperatureStatus.TOO_HOT
         return status
 
-    def calculate_average_temperature(self) -> float:
+    def calculate_average_temperature(self, stale: bool = False) -> float:
         """
         Calculate the average temperature emitted by sensors in the given Sense Boxes.
 
         This method retrieves the latest measurement from the past hour for each sensor
         in each Sense Box, and then calculates the average temperature.
 
+        Args:
+            stale (bool): Use cached sense boxes only, even if stale.
+                Requires a CachingRepository.
+
         Returns:
             float: The average temperature value of all sensors.
         """
         from_date = self._past_hour_timestamp()
-        sense_boxes = self.repository.find_all()
-        sensors_per_sense_box = [
-            sense_box.sensors for sense_box in sense_boxes if sense_box
-        ]
-        temperature_sensors = [
-            next(sensor for sensor in sensors if "temperatur" in sensor.title.lower())
-            for sensors in sensors_per_sense_box
-        ]
-        last_measurements = [
-            sensor.last_measurement.value
-            for sensor in temperature_sensors
-            if sensor and from_date < sensor.last_measurement.created_at
-        ]
-        if not last_measurements:
-            return None
-        return round(mean(last_measurements), 2)
+        if stale:
+            sense_boxes = self.repository.find_all(refresh=False)
+        else:
+            sense_boxes = self.repository.find_all()
+        with aggregation_duration.time():
+            sensors_per_sense_box = [
+                sense_box.sensors for sense_box in sense_boxes if sense_box
+            ]
+            temperature_sensors = [
+                next(
+                    sensor for sensor in sensors if "temperatur" in sensor.title.lower()
+                )
+                for sensors in sensors_per_sense_box
+            ]
+            last_measurements = [
+                sensor.last_measurement.value
+                for sensor in temperature_sensors
+                if sensor and from_date < sensor.last_measurement.created_at
+            ]
+            if not last_measurements:
+                return None
+            return round(mean(last_measurements), 2)
 
     def _past_hour_timestamp(self) -> datetime:
         """
@@ -108,18 +122,23 @@ class OpenSenseMapAvailabilityService:
     def is_available(self) -> bool:
         """
         Check if sensor data is available based on certain conditions.
-        - More than 50% + 1 sensors are available AND
+        - More than 50% + 1 sensors are cached within the last 5 minutes OR
         - Caching content is not older than 5 minutes.
 
+        Only the cache indexes in Redis are read, the API is never requested.
+
         Returns:
             bool: True if sensor data is available; False otherwise.
         """
-        sense_boxes = self.repository.find_all()
-        if sense_boxes.count(None) >= len(sense_boxes) // 2 + 1:
-            last_modified = self.caching_repository.last_modified_all()
-            return not all(
-                map(self._is_older_than(timedelta(minutes=5)), last_modified)
-            )
+        sense_box_ids = self.repository.sense_box_ids
+        max_age = timedelta(minutes=5)
+        since = datetime.now(timezone.utc) - max_age
+        missing = len(sense_box_ids) - self.caching_repository.count(
+            sense_box_ids, since=since
+        )
+        if missing >= len(sense_box_ids) // 2 + 1:
+            last_modified = self.caching_repository.last_modified_all(since=since)
+            return not all(map(self._is_older_than(max_age), last_modified))
         return True
 
     def _is_older_than(self, td):
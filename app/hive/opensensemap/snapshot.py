@@ -0,0 +1,59 @@
+"""
+Module for the local snapshot tier of the CachingRepository.
+
+This module defines the SnapshotStore class, which persists cached entities as files in a
+local directory, e.g., a volume mounted into the pod. It survives Redis flushes and Redis
+outages and is used to serve entities and to rehydrate Redis on cold start.
+"""
+import os
+import tempfile
+
+
+class SnapshotStore:
+    """
+    File based store holding one serialized cached entity per file.
+
+    Files are replaced atomically, so concurrent readers in other workers
+    never observe partially written entities.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def get(self, entity_id):
+        """
+        Returns the serialized cached entity for the given id, None if not present.
+        """
+        try:
+            with open(self._path(entity_id), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def put(self, entity_id, data):
+        """
+        Stores the serialized cached entity for the given id.
+        """
+        if isinstance(data, str):
+            data = data.encode()
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, self._path(entity_id))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def delete(self, entity_id):
+        """
+        Removes the serialized cached entity for the given id, if present.
+        """
+        try:
+            os.unlink(self._path(entity_id))
+        except FileNotFoundError:
+            pass
+
+    def _path(self, entity_id):
+        return os.path.join(self.directory, f"{os.path.basename(entity_id)}.json")
@@ -0,0 +1,212 @@
+"""
+Module for opt-in per-request profiling.
+
+This module defines
+    - the StackSampler class, a sampling profiler which periodically records the stacks
+      of the threads serving requests while they execute code of the hive package.
+    - the ProfilingMiddleware class, an ASGI middleware which profiles a request if
+      profiling is enabled by setting or if the request carries the admin token in the
+      `X-Hive-Profile` header.
+
+Traces are stored in collapsed-stack format (one `frame;frame;frame count` line per
+unique stack), which is understood by flamegraph.pl, speedscope and most flame graph
+tools. The file name is returned in the `X-Hive-Profile-Trace` response header. Only the
+latest traces are kept in the directory, older ones are removed.
+
+The middleware is only installed when profiling is configured (see `hive.app`), so it
+does not cost anything otherwise.
+"""
+from collections import Counter
+import asyncio
+from datetime import datetime, timezone
+import hmac
+import os
+import sys
+import threading
+import uuid
+
+import hive
+
+PROFILE_HEADER = b"x-hive-profile"
+TRACE_HEADER = b"x-hive-profile-trace"
+
+_HIVE_PATH = os.path.dirname(os.path.realpath(hive.__file__))
+
+# name of the threads of the threadpool running sync dependencies and endpoints
+THREADPOOL_THREAD_NAME = "AnyIO worker thread"
+
+
+class StackSampler:
+    """
+    Sampling profiler recording the stacks of the threads serving requests
+    while they run hive code.
+
+    Sync dependencies and endpoints are executed in the threadpool, hence the threads
+    named `thread_names` are sampled in addition to the thread which started the
+    sampler. Background threads, e.g., of the refresher or the registry, are not.
+    """
+
+    def __init__(self, interval: float = 0.001, thread_names=(THREADPOOL_THREAD_NAME,)):
+        self.interval = interval
+        self.thread_names = frozenset(thread_names)
+        self.samples = Counter()
+        self._owner_thread_id = None
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        """
+        Starts sampling in a background thread.
+        """
+        self._owner_thread_id = threading.get_ident()
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stops sampling and waits for the background thread to finish.
+        """
+        self._stopped.set()
+        self._thread.join()
+
+    def collapsed(self) -> str:
+        """
+        Returns the recorded samples in collapsed-stack format.
+        """
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.items())
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            sampled = {
+                thread.ident
+                for thread in threading.enumerate()
+                if thread.name in self.thread_names
+            }
+            sampled.add(self._owner_thread_id)
+            # pylint: disable=protected-access
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id not in sampled:
+                    continue
+                stack = self._collapse(frame)
+                if stack:
+                    self.samples[stack] += 1
+
+    def _collapse(self, frame):
+        """
+        Returns the stack of the given frame from root to leaf,
+        or None if the stack does not contain any frame of the hive package.
+        """
+        frames = []
+        contains_hive = False
+        while frame is not None:
+            code = frame.f_code
+            # frames of the profiler itself, e.g., of the thread stopping it, do not count
+            contains_hive = contains_hive or (
+                code.co_filename.startswith(_HIVE_PATH) and code.co_filename != __file__
+            )
+            filename = os.path.basename(code.co_filename)
+            frames.append(f"{code.co_name} ({filename}:{frame.f_lineno})")
+            frame = frame.f_back
+        if not contains_hive:
+            return None
+        return ";".join(reversed(frames))
+
+
+# pylint: disable=too-few-public-methods
+class ProfilingMiddleware:
+    """
+    ASGI middleware to profile single requests.
+
+    Only one request is profiled at a time; requests arriving while another one is
+    profiled are served without profiling. Concurrent requests executing hive code
+    in the threadpool of the same worker may still contribute samples to the trace.
+    At most `max_traces` traces are kept in `directory`.
+    """
+
+    # pylint: disable=too-many-arguments
+    def __init__(
+        self,
+        app,
+        *,
+        directory: str,
+        token: str = None,
+        always: bool = False,
+        interval: float = 0.001,
+        max_traces: int = 100,
+    ):
+        self.app = app
+        self.directory = directory
+        self.max_traces = max_traces
+        self.token = token.encode() if token else None
+        self.always = always
+        self.interval = interval
+        self._lock = threading.Lock()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._should_profile(scope):
+            await self.app(scope, receive, send)
+            return
+        # pylint: disable-next=consider-using-with
+        if not self._lock.acquire(blocking=False):
+            await self.app(scope, receive, send)
+            return
+
+        sampler = StackSampler(self.interval)
+
+        async def send_with_trace(message):
+            if message["type"] == "http.response.start":
+                # joining the sampler and writing the trace block, so not on the loop
+                trace = await asyncio.to_thread(self._store, scope, sampler)
+                message["headers"] = [
+                    *message.get("headers", []),
+                    (TRACE_HEADER, trace.encode()),
+                ]
+            await send(message)
+
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_with_trace)
+        finally:
+            await asyncio.to_thread(sampler.stop)
+            self._lock.release()
+
+    def _should_profile(self, scope) -> bool:
+        """
+        Returns True if profiling is always on or the request carries the admin token.
+        """
+        if self.always:
+            return True
+        if not self.token:
+            return False
+        for name, value in scope["headers"]:
+            if name == PROFILE_HEADER:
+                return hmac.compare_digest(value, self.token)
+        return False
+
+    def _store(self, scope, sampler) -> str:
+        """
+        Stops the sampler, stores its collapsed stacks and returns the file name.
+        Removes the oldest traces beyond `max_traces`.
+        """
+        sampler.stop()
+        timestamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+        path = scope["path"].strip("/").replace("/", "_") or "root"
+        filename = f"{timestamp}-{path}-{uuid.uuid4().hex[:8]}.collapsed"
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, filename), "w", encoding="utf-8") as f:
+            f.write(sampler.collapsed())
+        self._remove_old_traces()
+        return filename
+
+    def _remove_old_traces(self):
+        """
+        Removes the oldest traces so that at most `max_traces` are kept.
+        """
+        traces = sorted(
+            (entry for entry in os.scandir(self.directory) if entry.is_file()),
+            key=lambda entry: entry.stat().st_mtime,
+        )
+        for entry in traces[: max(len(traces) - self.max_traces, 0)]:
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass  # removed concurrently by another worker
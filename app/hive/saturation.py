@@ -0,0 +1,92 @@
+"""
+Module exporting saturation metrics of a worker, e.g., to autoscale on them.
+
+The app mostly waits on Redis and the OpenSenseMap API, so a saturated worker shows
+queued requests and a lagging event loop rather than high CPU usage. This module defines
+the saturation gauges and the SaturationMonitor class, which samples them periodically
+on the event loop of the worker.
+
+In-flight requests of all endpoints are exported by the `Instrumentator` as
+`http_requests_inprogress`, see `hive.app`.
+"""
+import asyncio
+import logging
+
+from anyio.to_thread import current_default_thread_limiter
+from prometheus_client import Gauge
+
+logger = logging.getLogger(__name__)
+
+NAMESPACE = "hive"
+
+event_loop_lag = Gauge(
+    "event_loop_lag_seconds",
+    "Delay of a timer on the event loop beyond its deadline",
+    namespace=NAMESPACE,
+    multiprocess_mode="livemax",
+)
+
+threadpool_busy = Gauge(
+    "threadpool_busy_threads",
+    "Threads of the threadpool running sync endpoints and dependencies",
+    namespace=NAMESPACE,
+    multiprocess_mode="livesum",
+)
+
+threadpool_queue = Gauge(
+    "threadpool_queue_depth",
+    "Tasks waiting for a free thread of the threadpool",
+    namespace=NAMESPACE,
+    multiprocess_mode="livesum",
+)
+
+admission_queue = Gauge(
+    "admission_queue_depth",
+    "Requests waiting to be admitted by the admission controller",
+    namespace=NAMESPACE,
+    multiprocess_mode="livesum",
+)
+
+refresher_backlog = Gauge(
+    "refresher_backlog",
+    "Sense boxes due for refresh but not yet refreshed by the refresher",
+    namespace=NAMESPACE,
+    multiprocess_mode="livesum",
+)
+
+
+class SaturationMonitor:
+    """
+    Samples the saturation gauges every `interval` seconds while `run` is awaited.
+
+    Further gauges are sampled from functions registered with `add_probe`,
+    e.g., the backlog of the refresher.
+    """
+
+    def __init__(self, interval: float = 1.0):
+        self.interval = interval
+        self._probes = []
+
+    def add_probe(self, gauge: Gauge, probe):
+        """
+        Registers a function returning the value of the given gauge.
+        """
+        self._probes.append((gauge, probe))
+
+    async def run(self):
+        """
+        Samples the gauges until cancelled.
+        """
+        loop = asyncio.get_running_loop()
+        limiter = current_default_thread_limiter()
+        while True:
+            deadline = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            event_loop_lag.set(max(loop.time() - deadline, 0))
+            threadpool_busy.set(limiter.borrowed_tokens)
+            threadpool_queue.set(limiter.statistics().tasks_waiting)
+            for gauge, probe in self._probes:
+                try:
+                    gauge.set(probe())
+                except Exception:  # pylint: disable=broad-exception-caught
+                    logger.exception("Sampling %s failed", gauge)
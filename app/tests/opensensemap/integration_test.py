@@ -3,7 +3,7 @@ Module: test_open_sense_map_api.py
 
 This module contains integration tests for the OpenSenseMap API endpoint in the hive.app module.
 """
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 import json
 
 from fastapi.testclient import TestClient
@@ -11,7 +11,8 @@ from testcontainers.redis import RedisContainer
 import pytest
 
 from hive.app import app
-from hive.opensensemap.di import get_redis
+from hive.opensensemap.di import get_admission, get_redis, get_service
+from hive.opensensemap.schemas import TemperatureBase
 
 client = TestClient(app)
 redis = RedisContainer()
@@ -84,11 +85,111 @@ def test_temperature(mocker):
     assert content["temperature"] == 10
 
 
+def test_temperature_admits_before_creating_service(mocker):
+    """
+    Test the temperature endpoint of the hive app with admission control.
+
+    Checks if the request is admitted before the sync dependencies
+    of the service are run in the threadpool.
+
+    Args:
+        mocker: Pytest mocker fixture for mocking the service.
+    """
+    # given
+    order = []
+
+    async def fake_admission():
+        order.append("admission")
+        yield True
+
+    def fake_service():
+        order.append("service")
+        service = mocker.Mock()
+        service.get_temperature.return_value = TemperatureBase(
+            temperature=10, status="Good"
+        )
+        return service
+
+    mocker.patch.dict(
+        app.dependency_overrides,
+        {get_admission: fake_admission, get_service: fake_service},
+    )
+
+    # when
+    response = client.get("/temperature")
+
+    # then
+    assert response.status_code == 200
+    assert order == ["admission", "service"]
+
+
+def fake_rate_limited_responses(mocker):
+    """
+    Helper function to mock the API responding to the first request
+    and with Too Many Requests afterwards.
+    """
+    ok_resp = mocker.Mock()
+    ok_resp.status_code = 200
+    ok_resp.json.return_value = fake_sense_box_data()
+    rate_limited_resp = mocker.Mock()
+    rate_limited_resp.status_code = 429
+    rate_limited_resp.headers = {"Retry-After": "30"}
+    return mocker.patch(
+        "hive.opensensemap.client.requests.get",
+        side_effect=[ok_resp] + [rate_limited_resp] * 10,
+    )
+
+
+def test_temperature_rate_limited_cold_boxes(mocker):
+    """
+    Test the temperature endpoint of the hive app with a rate limited API.
+
+    Checks if sense boxes which are not cached and cannot be requested
+    as the API is throttled are left out instead of failing the request.
+
+    Args:
+        mocker: Pytest mocker fixture for mocking requests lib.
+    """
+    # given
+    fake_rate_limited_responses(mocker)
+
+    # when
+    response = client.get("/temperature")
+
+    # then
+    assert response.status_code == 200
+    assert response.json()["temperature"] == 10
+
+
+def test_readyz_rate_limited(mocker):
+    """
+    Test the readyz endpoint of the hive app with a rate limited API.
+
+    Checks if the readyz endpoint returns OK response from the cache
+    while the API is throttled.
+
+    Args:
+        mocker: Pytest mocker fixture for mocking requests lib.
+    """
+    # given
+    get = fake_rate_limited_responses(mocker)
+    client.get("/temperature")
+    get.reset_mock()
+
+    # when
+    response = client.get("/readyz")
+
+    # then
+    assert response.status_code == 200
+    get.assert_not_called()
+
+
 def test_readyz_success(mocker):
     """
     Test the readyz endpoint of the hive app.
 
-    Checks if the readyz endpoint returns OK response when sensors are available.
+    Checks if the readyz endpoint returns OK response when sensors are cached,
+    without requesting the API.
 
     Args:
         mocker: Pytest mocker fixture for mocking requests lib.
@@ -98,12 +199,15 @@ def test_readyz_success(mocker):
     fake_resp.status_code = 200
     fake_resp.json.return_value = fake_sense_box_data()
 
-    mocker.patch("hive.opensensemap.client.requests.get", return_value=fake_resp)
+    get = mocker.patch("hive.opensensemap.client.requests.get", return_value=fake_resp)
+    client.get("/temperature")
+    get.reset_mock()
 
     # when
     response = client.get("/readyz")
     # then
     assert response.status_code == 200
+    get.assert_not_called()
 
 
 def test_readyz_failed(mocker):
@@ -144,16 +248,100 @@ def test_readyz_success_cache(mocker):
 
     mocker.patch("hive.opensensemap.client.requests.get", return_value=fake_resp)
 
-    fake_cache = json.dumps(
-        {
-            "last_modified": datetime.now(timezone.utc).isoformat(),
-            "entity": fake_sense_box_data(),
-        }
+    now = datetime.now(timezone.utc)
+    redis.get_client().hset(
+        "{hive}:box:a",
+        mapping={
+            "last_modified": now.isoformat(),
+            "entity": json.dumps(fake_sense_box_data()),
+        },
     )
-    redis.get_client().set("a", fake_cache)
-    redis.get_client().set("SenseBoxRepository_find_all", json.dumps(["a"]))
+    redis.get_client().zadd("{hive}:last_modified", {"a": now.timestamp()})
 
     # when
     response = client.get("/readyz")
     # then
     assert response.status_code == 200
+
+
+def test_readyz_failed_stale_cache(mocker):
+    """
+    Test the readyz endpoint of the hive app.
+
+    Checks if the readyz endpoint returns Service Unavailable response
+    when sensors are not available and caching content is outdated.
+
+    Args:
+        mocker: Pytest mocker fixture for mocking requests lib.
+    """
+    # given
+    fake_resp = mocker.Mock()
+    fake_resp.status_code = 404
+
+    mocker.patch("hive.opensensemap.client.requests.get", return_value=fake_resp)
+
+    two_days_ago = datetime.now(timezone.utc) - timedelta(days=2)
+    redis.get_client().hset(
+        "{hive}:box:a",
+        mapping={
+            "last_modified": two_days_ago.isoformat(),
+            "entity": json.dumps(fake_sense_box_data()),
+        },
+    )
+    redis.get_client().zadd("{hive}:last_modified", {"a": two_days_ago.timestamp()})
+
+    # when
+    response = client.get("/readyz")
+    # then
+    assert response.status_code == 503
+
+
+def test_admin_boxes(mocker):
+    """
+    Test the admin endpoints of the hive app.
+
+    Checks if an added sense box is warmed up and activated,
+    and if a removed sense box is evicted from the cache.
+
+    Args:
+        mocker: Pytest mocker fixture for mocking requests lib and settings.
+    """
+    # given
+    mocker.patch("hive.opensensemap.admin.settings", ADMIN_TOKEN="secret")
+    fake_resp = mocker.Mock()
+    fake_resp.status_code = 200
+    fake_resp.json.return_value = {**fake_sense_box_data(), "_id": "b"}
+    mocker.patch("hive.opensensemap.client.requests.get", return_value=fake_resp)
+    headers = {"Authorization": "Bearer secret"}
+
+    # when
+    added = client.put("/admin/boxes/b", headers=headers)
+    boxes_added = client.get("/admin/boxes", headers=headers).json()
+    removed = client.delete("/admin/boxes/b", headers=headers)
+    boxes_removed = client.get("/admin/boxes", headers=headers).json()
+
+    # then
+    assert added.status_code == 202
+    assert "b" in boxes_added["active"]
+    assert removed.status_code == 204
+    assert "b" not in boxes_removed["active"]
+    assert not redis.get_client().exists("{hive}:box:b")
+
+
+def test_admin_boxes_unauthorized(mocker):
+    """
+    Test the admin endpoints of the hive app without admin token.
+
+    Checks if requests without the admin token are rejected.
+
+    Args:
+        mocker: Pytest mocker fixture for mocking settings.
+    """
+    # given
+    mocker.patch("hive.opensensemap.admin.settings", ADMIN_TOKEN="secret")
+
+    # when
+    response = client.put("/admin/boxes/b", headers={"Authorization": "Bearer wrong"})
+
+    # then
+    assert response.status_code == 401
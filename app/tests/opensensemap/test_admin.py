@@ -0,0 +1,111 @@
+"""
+Module: test_admin.py
+
+This module contains unit tests for the methods in the hive.opensensemap.admin module.
+"""
+from unittest.mock import Mock
+
+import pytest
+import requests
+
+from hive.opensensemap.admin import warm_up
+from hive.opensensemap.client import UpstreamRateLimited
+
+
+@pytest.fixture(name="registry")
+def fixture_registry():
+    """
+    Creates a registry mock with the sense box "b" pending.
+    """
+    registry = Mock()
+    registry.pending.return_value = ["b"]
+    return registry
+
+
+@pytest.fixture(name="timer")
+def fixture_timer(mocker):
+    """
+    Patches the timer retrying warm-ups.
+    """
+    return mocker.patch("hive.opensensemap.admin.threading.Timer")
+
+
+def test_warm_up_activates_sense_box(registry, timer):
+    """
+    Test the `warm_up` function.
+
+    Checks if the sense box is activated once cached.
+    """
+    # given
+    caching_repository = Mock()
+    # when
+    warm_up("b", registry, caching_repository)
+    # then
+    caching_repository.load.assert_called_once_with("b")
+    registry.activate.assert_called_once_with("b")
+    registry.remove.assert_not_called()
+    timer.assert_not_called()
+
+
+def test_warm_up_removes_unknown_sense_box(registry, timer):
+    """
+    Test the `warm_up` function with a sense box the API does not know.
+
+    Checks if the sense box is removed.
+    """
+    # given
+    caching_repository = Mock()
+    caching_repository.load.return_value = None
+    # when
+    warm_up("b", registry, caching_repository)
+    # then
+    registry.remove.assert_called_once_with("b")
+    registry.activate.assert_not_called()
+    timer.assert_not_called()
+
+
+@pytest.mark.parametrize(
+    "error, retry_after",
+    [
+        (requests.Timeout(), 5),
+        (requests.HTTPError("Server error 503"), 5),
+        (UpstreamRateLimited(30), 30),
+    ],
+)
+def test_warm_up_retries_on_failure(registry, timer, error, retry_after):
+    """
+    Test the `warm_up` function when requesting the API fails.
+
+    Checks if the sense box stays pending and the warm-up is retried,
+    not before the API allows it again if throttled.
+    """
+    # given
+    caching_repository = Mock()
+    caching_repository.load.side_effect = error
+    # when
+    warm_up("b", registry, caching_repository, retry_after=5)
+    # then
+    registry.remove.assert_not_called()
+    registry.activate.assert_not_called()
+    timer.assert_called_once_with(
+        retry_after,
+        warm_up,
+        ("b", registry, caching_repository, retry_after * 2),
+    )
+    timer.return_value.start.assert_called_once()
+
+
+def test_warm_up_stops_retrying_removed_sense_box(registry, timer):
+    """
+    Test the `warm_up` function for a sense box which is no longer pending.
+
+    Checks if the API is not requested, e.g., when retrying a removed sense box.
+    """
+    # given
+    registry.pending.return_value = []
+    caching_repository = Mock()
+    # when
+    warm_up("b", registry, caching_repository)
+    # then
+    caching_repository.load.assert_not_called()
+    timer.assert_not_called()
@@ -0,0 +1,62 @@
+"""
+Module: test_admission.py
+
+This module contains unit tests for the methods in the hive.opensensemap.admission module.
+"""
+import asyncio
+
+from hive.opensensemap.admission import AdmissionController
+
+
+def test_admit_rejects_beyond_queue():
+    """
+    Test the `AdmissionController.admit` method under overload.
+
+    Checks if requests beyond in-flight and queue limits are not admitted
+    and queued requests are admitted once a slot is free.
+    """
+    # given
+    uut = AdmissionController(max_in_flight=1, max_queue=1, queue_timeout=5)
+    release = asyncio.Event()
+    results = []
+
+    async def request():
+        async with uut.admit() as admitted:
+            results.append(admitted)
+            if admitted:
+                await release.wait()
+
+    async def scenario():
+        tasks = [asyncio.create_task(request()) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        in_flight, queued = uut.in_flight, uut.queued
+        release.set()
+        await asyncio.gather(*tasks)
+        return in_flight, queued
+
+    # when
+    in_flight, queued = asyncio.run(scenario())
+    # then
+    assert (in_flight, queued) == (1, 1)
+    assert results == [True, False, True]
+    assert uut.in_flight == 0 and uut.queued == 0
+
+
+def test_admit_rejects_after_queue_timeout():
+    """
+    Test the `AdmissionController.admit` method with a queue timeout.
+
+    Checks if a queued request is not admitted once it waited for `queue_timeout`.
+    """
+    # given
+    uut = AdmissionController(max_in_flight=1, max_queue=1, queue_timeout=0.01)
+
+    async def scenario():
+        async with uut.admit():
+            async with uut.admit() as admitted:
+                return admitted
+
+    # when
+    admitted = asyncio.run(scenario())
+    # then
+    assert admitted is False
@@ -0,0 +1,98 @@
+"""
+Module: test_client.py
+
+This module contains unit tests for the methods in the hive.opensensemap.client module.
+"""
+from prometheus_client import REGISTRY
+import pytest
+import requests
+
+from hive.opensensemap.client import OpenSenseMapClient, UpstreamRateLimited
+
+
+def upstream_request_count(status_code):
+    """
+    Returns the number of observed upstream requests for the given status code label.
+    """
+    value = REGISTRY.get_sample_value(
+        "opensensemap_upstream_request_duration_seconds_count",
+        {"status_code": status_code},
+    )
+    return value or 0
+
+
+@pytest.mark.parametrize("status_code", [200, 404])
+def test_fetch_sense_box_observes_latency_per_status_code(mocker, status_code):
+    """
+    Test the `OpenSenseMapClient.fetch_sense_box` method.
+
+    Checks if the upstream latency histogram is observed with the response status code.
+    """
+    # given
+    fake_resp = mocker.Mock()
+    fake_resp.status_code = status_code
+    fake_resp.json.return_value = {}
+    mocker.patch("hive.opensensemap.client.requests.get", return_value=fake_resp)
+    before = upstream_request_count(str(status_code))
+    uut = OpenSenseMapClient("http://localhost")
+    # when
+    uut.fetch_sense_box("a")
+    # then
+    assert upstream_request_count(str(status_code)) == before + 1
+
+
+def test_fetch_sense_box_observes_latency_on_error(mocker):
+    """
+    Test the `OpenSenseMapClient.fetch_sense_box` method.
+
+    Checks if failing upstream requests are observed with the "error" label and re-raised.
+    """
+    # given
+    mocker.patch(
+        "hive.opensensemap.client.requests.get",
+        side_effect=requests.ConnectionError(),
+    )
+    before = upstream_request_count("error")
+    uut = OpenSenseMapClient("http://localhost")
+    # when
+    with pytest.raises(requests.ConnectionError):
+        uut.fetch_sense_box("a")
+    # then
+    assert upstream_request_count("error") == before + 1
+
+
+def test_fetch_sense_box_raises_on_too_many_requests(mocker):
+    """
+    Test the `OpenSenseMapClient.fetch_sense_box` method with a Too Many Requests response.
+
+    Checks if UpstreamRateLimited is raised with the time given in the Retry-After header.
+    """
+    # given
+    fake_resp = mocker.Mock()
+    fake_resp.status_code = 429
+    fake_resp.headers = {"Retry-After": "12"}
+    mocker.patch("hive.opensensemap.client.requests.get", return_value=fake_resp)
+    uut = OpenSenseMapClient("http://localhost")
+    # when
+    with pytest.raises(UpstreamRateLimited) as error:
+        uut.fetch_sense_box("a")
+    # then
+    assert error.value.retry_after == 12
+
+
+def test_fetch_sense_box_raises_on_server_error(mocker):
+    """
+    Test the `OpenSenseMapClient.fetch_sense_box` method with a server error response.
+
+    Checks if an HTTPError is raised instead of treating the sense box as not found.
+    """
+    # given
+    fake_resp = mocker.Mock()
+    fake_resp.status_code = 503
+    mocker.patch("hive.opensensemap.client.requests.get", return_value=fake_resp)
+    uut = OpenSenseMapClient("http://localhost")
+    # when
+    with pytest.raises(requests.HTTPError) as error:
+        uut.fetch_sense_box("a")
+    # then
+    assert error.value.response == fake_resp
@@ -0,0 +1,173 @@
+"""
+Module: test_di.py
+
+This module contains unit tests for the methods in the hive.opensensemap.di module.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import os
+import subprocess
+import sys
+
+import pytest
+
+from hive.opensensemap import di
+from hive.opensensemap.recording import RecordingClient, ReplayClient
+
+
+@pytest.fixture(name="recording_settings")
+def fixture_recording_settings(mocker, tmp_path):
+    """
+    Configures recording into tmp_path against a fake upstream.
+    """
+    mocker.patch(
+        "hive.opensensemap.di.settings",
+        OPEN_SENSE_MAP_API_BASE_URL="http://upstream",
+        UPSTREAM_REPLAY="",
+        UPSTREAM_RECORD=str(tmp_path / "boxes.jsonl.gz"),
+        UPSTREAM_RATE_LIMIT=0,
+    )
+    upstream = mocker.patch("hive.opensensemap.di.OpenSenseMapClient")
+    upstream.return_value.fetch_sense_box.side_effect = lambda id: {"_id": id}
+    di._get_recording_client.cache_clear()  # pylint: disable=protected-access
+    yield tmp_path
+    di._get_recording_client.cache_clear()  # pylint: disable=protected-access
+
+
+def test_get_client_records_into_one_archive_per_process(recording_settings):
+    """
+    Test the `get_client` function with recording.
+
+    Checks if all requests share one RecordingClient writing to an archive
+    of this process, which stays readable when written concurrently.
+    """
+    # given
+    sense_box_ids = [f"box-{i}" for i in range(64)]
+
+    def request(sense_box_id):
+        client = di.get_client(None)
+        client.fetch_sense_box(sense_box_id)
+        return client
+
+    # when
+    with ThreadPoolExecutor(8) as executor:
+        clients = list(executor.map(request, sense_box_ids))
+    di.close_recording()
+    # then
+    assert isinstance(clients[0], RecordingClient)
+    assert all(client is clients[0] for client in clients)
+    path = recording_settings / f"boxes-{os.getpid()}.jsonl.gz"
+    assert clients[0].path == str(path)
+    assert sorted(ReplayClient.load(str(path)).sense_box_ids) == sorted(sense_box_ids)
+
+
+def test_get_client_imports_optional_modules_only_if_configured():
+    """
+    Test the `get_client` function with the default configuration.
+
+    Checks if neither recording, replay nor rate limiting are imported
+    when starting the app, as they are not configured.
+    """
+    # given
+    env = {
+        name: value
+        for name, value in os.environ.items()
+        if not name.startswith("HIVE_UPSTREAM_")
+    }
+    script = (
+        "import sys\n"
+        "import hive.app\n"
+        "from hive.opensensemap import di\n"
+        "di.get_client(None)\n"
+        "print(sorted(set(sys.modules) & "
+        "{'hive.opensensemap.ratelimit', 'hive.opensensemap.recording'}))\n"
+    )
+    # when
+    result = subprocess.run(
+        [sys.executable, "-c", script],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    # then
+    assert result.stdout.strip() == "[]"
+
+
+def test_create_redis_sentinel(mocker):
+    """
+    Test the `_create_redis` function in sentinel mode.
+
+    Checks if the master and replicas are discovered via the configured sentinels.
+    """
+    # given
+    mocker.patch(
+        "hive.opensensemap.di.settings",
+        REDIS_SENTINELS="sentinel-0:26379, sentinel-1:26379",
+        REDIS_SENTINEL_MASTER="mymaster",
+    )
+    sentinel = mocker.patch("hive.opensensemap.di.Sentinel")
+    # pylint: disable=protected-access
+    create_redis = di._create_redis.__wrapped__
+    # when
+    primary = create_redis("sentinel")
+    replica = create_redis("sentinel", replica=True)
+    # then
+    sentinel.assert_called_with([("sentinel-0", 26379), ("sentinel-1", 26379)])
+    assert primary == sentinel.return_value.master_for.return_value
+    assert replica == sentinel.return_value.slave_for.return_value
+    sentinel.return_value.master_for.assert_called_once_with("mymaster")
+    sentinel.return_value.slave_for.assert_called_once_with("mymaster")
+
+
+@pytest.mark.parametrize("replica", [False, True])
+def test_create_redis_cluster(mocker, replica):
+    """
+    Test the `_create_redis` function in cluster mode.
+
+    Checks if the cluster is connected via the configured startup node
+    and reads from replicas only for the replica instance.
+    """
+    # given
+    mocker.patch(
+        "hive.opensensemap.di.settings", REDIS_HOST="redis-cluster", REDIS_PORT=6379
+    )
+    cluster = mocker.patch("hive.opensensemap.di.RedisCluster")
+    # when
+    # pylint: disable-next=protected-access
+    result = di._create_redis.__wrapped__("cluster", replica=replica)
+    # then
+    assert result == cluster.return_value
+    cluster.assert_called_once_with(
+        host="redis-cluster", port=6379, read_from_replicas=replica
+    )
+
+
+def test_create_redis_unknown_mode():
+    """
+    Test the `_create_redis` function with an unknown mode.
+
+    Checks if a ValueError is raised.
+    """
+    # when
+    with pytest.raises(ValueError) as error:
+        # pylint: disable-next=protected-access
+        di._create_redis.__wrapped__("unknown")
+    # then
+    assert "unknown" in str(error.value)
+
+
+def test_close_recording(recording_settings):
+    """
+    Test the `close_recording` function.
+
+    Checks if the archive of the RecordingClient of this process is closed,
+    so that all recorded responses are written.
+    """
+    # given
+    client = di.get_client(None)
+    client.fetch_sense_box("a")
+    # when
+    di.close_recording()
+    # then
+    path = recording_settings / f"boxes-{os.getpid()}.jsonl.gz"
+    assert ReplayClient.load(str(path)).sense_box_ids == ["a"]
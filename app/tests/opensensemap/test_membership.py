@@ -0,0 +1,78 @@
+"""
+Module: test_membership.py
+
+This module contains unit tests for the methods in the hive.opensensemap.membership module.
+"""
+from unittest.mock import Mock
+
+from testcontainers.redis import RedisContainer
+
+from hive.opensensemap.membership import HashRing, Membership
+
+KEYS = [f"box-{i:04d}" for i in range(1000)]
+
+
+def test_ring_moves_keys_to_joining_member_only():
+    """
+    Test the `HashRing.owner` method when a member joins.
+
+    Checks if keys are spread over all members and keys only move
+    to the joining member.
+    """
+    # given
+    before = HashRing(["a", "b", "c"])
+    after = HashRing(["a", "b", "c", "d"])
+    # when
+    owners_before = {key: before.owner(key) for key in KEYS}
+    owners_after = {key: after.owner(key) for key in KEYS}
+    # then
+    moved = [key for key in KEYS if owners_before[key] != owners_after[key]]
+    assert set(owners_before.values()) == {"a", "b", "c"}
+    assert all(owners_after[key] == "d" for key in moved)
+    assert 0 < len(moved) < len(KEYS) / 2
+
+
+def test_heartbeat_rebuilds_ring():
+    """
+    Test the `Membership.heartbeat` method.
+
+    Checks if the ring is rebuilt from the live members and listeners are
+    notified only if the members changed.
+    """
+    # given
+    redis = Mock()
+    redis.register_script.return_value.return_value = [b"a", b"b"]
+    rings = []
+    uut = Membership(redis, member_id="a")
+    uut.add_listener(rings.append)
+    # when
+    uut.heartbeat()
+    uut.heartbeat()
+    # then
+    assert uut.ring.members == ("a", "b")
+    assert len(rings) == 1
+    assert uut.owns("box-0000") == (rings[0].owner("box-0000") == "a")
+
+
+def test_heartbeat_takes_time_from_redis():
+    """
+    Test the `Membership.heartbeat` method against Redis.
+
+    Checks if heartbeats are scored by the time of Redis, not of the pod,
+    so that members on pods with skewed clocks do not remove each other.
+    """
+    # given
+    container = RedisContainer()
+    container.start()
+    redis = container.get_client()
+    uut = Membership(redis, member_id="a", timeout=15)
+    other = Membership(redis, member_id="b", timeout=15)
+    # when
+    uut.heartbeat()
+    ring = other.heartbeat()
+    seconds, microseconds = redis.time()
+    score = redis.zscore("hive:members", "a")
+    container.stop()
+    # then
+    assert ring.members == ("a", "b")
+    assert abs(score - (seconds + microseconds / 1e6)) < 1
@@ -0,0 +1,73 @@
+"""
+Module: test_ratelimit.py
+
+This module contains unit tests for the methods in the hive.opensensemap.ratelimit module.
+"""
+from unittest.mock import Mock
+
+import pytest
+from testcontainers.redis import RedisContainer
+
+from hive.opensensemap.client import UpstreamRateLimited
+from hive.opensensemap.ratelimit import RateLimitedClient, TokenBucket
+
+
+@pytest.fixture(name="redis", scope="module")
+def fixture_redis():
+    """
+    Starts a Redis testcontainer and returns a client.
+    """
+    container = RedisContainer()
+    container.start()
+    yield container.get_client()
+    container.stop()
+
+
+def test_token_bucket_take(redis):
+    """
+    Test the `TokenBucket.take` method.
+
+    Checks if up to capacity tokens are taken immediately,
+    and afterwards the time until the next token is returned.
+    """
+    # given
+    uut = TokenBucket(redis, "test:take", rate=1, capacity=2)
+    # when
+    waits = [uut.take() for _ in range(3)]
+    # then
+    assert waits[:2] == [0, 0]
+    assert 0.9 < waits[2] <= 1
+
+
+def test_token_bucket_block(redis):
+    """
+    Test the `TokenBucket.block` method.
+
+    Checks if no tokens are taken while the bucket is blocked.
+    """
+    # given
+    uut = TokenBucket(redis, "test:block", rate=100, capacity=10)
+    # when
+    uut.block(30)
+    # then
+    assert 29 < uut.take() <= 30
+    assert uut.acquire(max_wait=0.1) > 0
+
+
+def test_rate_limited_client_blocks_bucket_on_too_many_requests():
+    """
+    Test the `RateLimitedClient.fetch_sense_box` method with a throttled upstream.
+
+    Checks if the bucket is blocked for the Retry-After time of the upstream.
+    """
+    # given
+    delegate = Mock()
+    delegate.fetch_sense_box.side_effect = UpstreamRateLimited(12)
+    bucket = Mock()
+    bucket.acquire.return_value = 0
+    uut = RateLimitedClient(delegate, bucket)
+    # when
+    with pytest.raises(UpstreamRateLimited):
+        uut.fetch_sense_box("a")
+    # then
+    bucket.block.assert_called_once_with(12)
@@ -0,0 +1,74 @@
+"""
+Module: test_recording.py
+
+This module contains unit tests for the methods in the hive.opensensemap.recording module.
+"""
+from unittest.mock import Mock
+
+from hive.opensensemap.recording import RecordingClient, ReplayClient
+
+
+def test_replay_recorded_responses(tmp_path):
+    """
+    Test the `RecordingClient` and `ReplayClient` classes.
+
+    Checks if recorded responses are replayed per sense box in recorded order
+    and start over once all responses have been replayed.
+    """
+    # given
+    archive = str(tmp_path / "archive.jsonl.gz")
+    delegate = Mock()
+    delegate.fetch_sense_box.side_effect = [{"_id": "a", "v": 1}, None, {"_id": "a"}]
+    with RecordingClient(delegate, archive) as recorder:
+        for sense_box_id in ["a", "b", "a"]:
+            recorder.fetch_sense_box(sense_box_id)
+    # when
+    uut = ReplayClient.load(archive, speed=0)
+    # then
+    assert uut.sense_box_ids == ["a", "b"]
+    assert uut.fetch_sense_box("a") == {"_id": "a", "v": 1}
+    assert uut.fetch_sense_box("a") == {"_id": "a"}
+    assert uut.fetch_sense_box("a") == {"_id": "a", "v": 1}
+    assert uut.fetch_sense_box("b") is None
+    assert uut.fetch_sense_box("unknown") is None
+
+
+def test_replay_at_recorded_speed(mocker):
+    """
+    Test the `ReplayClient.fetch_sense_box` method.
+
+    Checks if responses are delayed by the recorded duration divided by speed.
+    """
+    # given
+    sleep = mocker.patch("hive.opensensemap.recording.time.sleep")
+    records = [{"sense_box_id": "a", "duration": 0.5, "data": {}}]
+    uut = ReplayClient(records, speed=2)
+    # when
+    uut.fetch_sense_box("a")
+    # then
+    sleep.assert_called_once_with(0.25)
+
+
+def test_record_into_single_gzip_stream(tmp_path):
+    """
+    Test the `RecordingClient` class.
+
+    Checks if all responses are written into a single gzip member,
+    which is replayable even if the archive was not closed.
+    """
+    # given
+    archive = tmp_path / "archive.jsonl.gz"
+    delegate = Mock()
+    delegate.fetch_sense_box.side_effect = lambda sense_box_id: {"_id": sense_box_id}
+    uut = RecordingClient(delegate, str(archive))
+    for sense_box_id in ["a", "b", "c"]:
+        uut.fetch_sense_box(sense_box_id)
+    # when
+    uut.close()
+    uut.fetch_sense_box("d")
+    # then
+    data = archive.read_bytes()
+    assert data.count(b"\x1f\x8b\x08") == 1
+    truncated = tmp_path / "truncated.jsonl.gz"
+    truncated.write_bytes(data[:-8])
+    assert ReplayClient.load(str(truncated)).sense_box_ids == ["a", "b", "c"]
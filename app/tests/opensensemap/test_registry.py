@@ -0,0 +1,53 @@
+"""
+Module: test_registry.py
+
+This module contains unit tests for the methods in the hive.opensensemap.registry module.
+"""
+from unittest.mock import Mock
+
+from hive.opensensemap.registry import SenseBoxRegistry
+
+
+def test_load_notifies_listeners():
+    """
+    Test the `SenseBoxRegistry.load` method.
+
+    Checks if the registry is seeded once, the ids are kept in memory
+    and listeners are notified of added and removed ids.
+    """
+    # given
+    redis = Mock()
+    redis.set.side_effect = [True, None]
+    redis.smembers.side_effect = [{b"a", b"b"}, {b"b", b"c"}]
+    changes = []
+    uut = SenseBoxRegistry(redis, seed=["a", "b"])
+    uut.add_listener(lambda added, removed: changes.append((added, removed)))
+    # when
+    uut.load()
+    uut.load()
+    # then
+    assert uut.sense_box_ids == ("b", "c")
+    assert "c" in uut and "a" not in uut
+    assert changes == [({"a", "b"}, set()), ({"c"}, {"a"})]
+    redis.sadd.assert_called_once_with("hive:boxes", "a", "b")
+
+
+def test_replace_updates_difference():
+    """
+    Test the `SenseBoxRegistry.replace` method.
+
+    Checks if only removed ids are removed and the set of active ids is never deleted,
+    so that concurrent reloads do not see it empty.
+    """
+    # given
+    redis = Mock()
+    redis.smembers.return_value = {b"a", b"b"}
+    pipeline = redis.pipeline.return_value
+    uut = SenseBoxRegistry(redis)
+    # when
+    uut.replace(["b", "c"])
+    # then
+    pipeline.srem.assert_called_once_with("hive:boxes", "a")
+    pipeline.sadd.assert_called_once()
+    assert set(pipeline.sadd.call_args.args[1:]) == {"b", "c"}
+    pipeline.delete.assert_called_once_with("hive:boxes:pending")
@@ -0,0 +1,531 @@
+"""
+Module: test_repository.py
+
+This module contains unit tests for the methods in the hive.opensensemap.repository module.
+"""
+from datetime import datetime, timedelta, timezone
+import json
+import threading
+from unittest.mock import Mock
+
+import pytest
+import requests
+
+from hive.opensensemap.client import UpstreamRateLimited
+from hive.opensensemap.model import CachedEntity, Measurement, SenseBox, Sensor
+from hive.opensensemap.repository import CachingRepository, SenseBoxRepository
+from hive.opensensemap.scheduler import RefreshPolicy
+from hive.opensensemap.snapshot import SnapshotStore
+
+
+class FakeRedis(dict):
+    """
+    In-memory stand-in for the Redis commands used by CachingRepository.
+    """
+
+    def get(self, key, default=None):
+        """
+        Returns the string stored under key.
+        """
+        return super().get(key, default)
+
+    def set(self, key, value, nx=False, **_):
+        """
+        Stores value under key, only if key does not exist if nx is set.
+        """
+        if nx and key in self:
+            return None
+        self[key] = str(value).encode() if not isinstance(value, bytes) else value
+        return True
+
+    def type(self, key):
+        """
+        Returns the type of the value stored under key.
+        """
+        if key not in self:
+            return b"none"
+        return b"string" if isinstance(self[key], bytes) else b"hash"
+
+    def exists(self, key):
+        """
+        Returns 1 if key exists, 0 otherwise.
+        """
+        return int(key in self)
+
+    def delete(self, *keys):
+        """
+        Removes the given keys.
+        """
+        for key in keys:
+            self.pop(key, None)
+
+    def hset(self, key, mapping):
+        """
+        Stores the fields of mapping in the hash under key.
+        """
+        self.setdefault(key, {}).update(
+            {name.encode(): str(value).encode() for name, value in mapping.items()}
+        )
+
+    def hgetall(self, key):
+        """
+        Returns all fields of the hash under key.
+        """
+        return dict(super().get(key, {}))
+
+    def zadd(self, key, mapping):
+        """
+        Adds the members of mapping to the sorted set under key.
+        """
+        self.setdefault(key, {}).update(mapping)
+
+    def zscore(self, key, member):
+        """
+        Returns the score of member in the sorted set under key.
+        """
+        return super().get(key, {}).get(member)
+
+    def zmscore(self, key, members):
+        """
+        Returns the scores of members in the sorted set under key.
+        """
+        scores = super().get(key, {})
+        return [scores.get(member) for member in members]
+
+    def zrangebyscore(self, key, minimum, maximum, withscores=False):
+        """
+        Returns the members of the sorted set under key within the given scores.
+        """
+        members = sorted(super().get(key, {}).items(), key=lambda item: item[1])
+        members = [
+            (member.encode(), score)
+            for member, score in members
+            if float(minimum) <= score <= float(maximum)
+        ]
+        return members if withscores else [member for member, _ in members]
+
+    def pipeline(self, **_):
+        """
+        Returns a pipeline queueing commands until `execute` is called.
+        """
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    """
+    Pipeline of FakeRedis.
+    """
+
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+
+    def __getattr__(self, command):
+        return lambda *args, **kwargs: self.commands.append((command, args, kwargs))
+
+    def execute(self):
+        """
+        Runs all queued commands and returns their results.
+        """
+        return [
+            getattr(self.redis, command)(*args, **kwargs)
+            for command, args, kwargs in self.commands
+        ]
+
+
+def cached_entity(redis, sense_box_id):
+    """
+    Helper function to parse the cached entity stored in the hash of the given id.
+    """
+    fields = {
+        name.decode(): value.decode()
+        for name, value in redis.hgetall(f"hive:box:{sense_box_id}").items()
+        if value
+    }
+    fields["entity"] = json.loads(fields["entity"])
+    return CachedEntity(**fields)
+
+
+def fake_sense_box(sense_box_id):
+    """
+    Helper function to create a SenseBox with the given id.
+    """
+    measurement = Measurement(created_at=datetime.now(timezone.utc), value=10)
+    sensor = Sensor(id="some-id", title="temperatur", last_measurement=measurement)
+    return SenseBox(id=sense_box_id, name="some-name", sensors=[sensor])
+
+
+def fake_delegate(sense_box_ids):
+    """
+    Helper function to create a delegate repository returning fake sense boxes.
+    """
+    delegate = Mock()
+    delegate.sense_box_ids = sense_box_ids
+    delegate.find.side_effect = fake_sense_box
+    return delegate
+
+
+def test_find_rehydrates_redis_from_snapshot(tmp_path):
+    """
+    Test the `CachingRepository.find` method with a snapshot tier.
+
+    Checks if an entity missing in Redis is served from the snapshot without
+    requesting the delegate and is copied back into Redis.
+    """
+    # given
+    snapshot = SnapshotStore(str(tmp_path))
+    delegate = fake_delegate(["a"])
+    CachingRepository(delegate, SenseBox, FakeRedis(), snapshot=snapshot).find("a")
+    delegate.find.reset_mock()
+    redis = FakeRedis()
+    uut = CachingRepository(delegate, SenseBox, redis, snapshot=snapshot)
+    # when
+    result = uut.find("a")
+    # then
+    assert result.id == "a"
+    delegate.find.assert_not_called()
+    assert cached_entity(redis, "a") == CachedEntity(**json.loads(snapshot.get("a")))
+    assert uut.last_modified("a") == cached_entity(redis, "a").last_modified
+
+
+def test_warm_up_fetches_all_sense_boxes():
+    """
+    Test the `CachingRepository.warm_up` method.
+
+    Checks if all sense boxes of the delegate are fetched and cached
+    so that `find_all` is served from the cache afterwards.
+    """
+    # given
+    delegate = fake_delegate(["a", "b", "c"])
+    uut = CachingRepository(delegate, SenseBox, FakeRedis())
+    # when
+    warmed_up = uut.warm_up(max_workers=2)
+    result = uut.find_all()
+    # then
+    assert [sense_box.id for sense_box in warmed_up] == ["a", "b", "c"]
+    assert [sense_box.id for sense_box in result] == ["a", "b", "c"]
+    assert delegate.find.call_count == 3
+
+
+def test_warm_up_skips_leased_sense_boxes():
+    """
+    Test the `CachingRepository.warm_up` method while another worker warms up.
+
+    Checks if missing sense boxes leased by another worker are not requested.
+    """
+    # given
+    delegate = fake_delegate(["a", "b"])
+    redis = FakeRedis()
+    redis.set("hive:lease:a", 1)
+    uut = CachingRepository(delegate, SenseBox, redis)
+    # when
+    warmed_up = uut.warm_up(max_workers=2)
+    # then
+    assert warmed_up[0] is None
+    assert warmed_up[1].id == "b"
+    delegate.find.assert_called_once_with("b")
+
+
+def test_warm_up_cancelled():
+    """
+    Test the `CachingRepository.warm_up` method once cancelled.
+
+    Checks if no more sense boxes are requested, while cached ones are returned.
+    """
+    # given
+    delegate = fake_delegate(["a", "b"])
+    redis = FakeRedis()
+    uut = CachingRepository(delegate, SenseBox, redis)
+    uut.find("a")
+    delegate.find.reset_mock()
+    cancelled = threading.Event()
+    cancelled.set()
+    # when
+    warmed_up = uut.warm_up(max_workers=2, cancelled=cancelled)
+    # then
+    assert warmed_up[0].id == "a"
+    assert warmed_up[1] is None
+    delegate.find.assert_not_called()
+
+
+def test_refresh_learns_report_interval():
+    """
+    Test the `CachingRepository.refresh` method with a refresh policy.
+
+    Checks if the report interval is learned from successive measurements
+    and the next refresh is scheduled after the next expected measurement.
+    """
+    # given
+    first, second = fake_sense_box("a"), fake_sense_box("a")
+    first.sensors[0].last_measurement.created_at = second.last_measured_at - timedelta(
+        minutes=10
+    )
+    delegate = fake_delegate(["a"])
+    delegate.find.side_effect = [first, second]
+    redis = FakeRedis()
+    policy = RefreshPolicy(jitter=0, grace=timedelta(0))
+    uut = CachingRepository(delegate, SenseBox, redis, refresh_policy=policy)
+    uut.find("a")
+    redis.zadd("hive:refresh_at", {"a": datetime.now(timezone.utc).timestamp()})
+    # when
+    refresh_at = uut.refresh("a")
+    # then
+    cache = cached_entity(redis, "a")
+    assert cache.report_interval == 600
+    assert cache.updates == 2
+    assert refresh_at == cache.refresh_at
+    assert refresh_at == second.last_measured_at + timedelta(minutes=10)
+    assert redis.zscore("hive:refresh_at", "a") == refresh_at.timestamp()
+
+
+def test_last_modified_all_since():
+    """
+    Test the `CachingRepository.last_modified_all` method with a lower bound.
+
+    Checks if only entities modified after the given time are returned.
+    """
+    # given
+    now = datetime.now(timezone.utc)
+    redis = FakeRedis()
+    redis.zadd(
+        "hive:last_modified",
+        {
+            "a": (now - timedelta(minutes=10)).timestamp(),
+            "b": (now - timedelta(minutes=1)).timestamp(),
+        },
+    )
+    uut = CachingRepository(fake_delegate(["a", "b"]), SenseBox, redis)
+    # when
+    result = uut.last_modified_all(since=now - timedelta(minutes=5))
+    # then
+    assert result == [
+        datetime.fromtimestamp(redis["hive:last_modified"]["b"], timezone.utc)
+    ]
+
+
+def test_count_since():
+    """
+    Test the `CachingRepository.count` method with a lower bound.
+
+    Checks if only entities of the delegate modified after the given time are counted.
+    """
+    # given
+    now = datetime.now(timezone.utc)
+    redis = FakeRedis()
+    redis.zadd(
+        "hive:last_modified",
+        {
+            "a": (now - timedelta(days=2)).timestamp(),
+            "b": (now - timedelta(minutes=1)).timestamp(),
+            "removed": (now - timedelta(minutes=1)).timestamp(),
+        },
+    )
+    uut = CachingRepository(fake_delegate(["a", "b", "c"]), SenseBox, redis)
+    # when
+    result = uut.count(since=now - timedelta(minutes=5))
+    # then
+    assert result == 1
+    assert uut.count() == 2
+
+
+def test_migrate_legacy_keys():
+    """
+    Test the `CachingRepository.migrate_legacy_keys` method.
+
+    Checks if entities cached as JSON strings under their bare id are moved into
+    the namespaced layout and the legacy keys are removed.
+    """
+    # given
+    now = datetime.now(timezone.utc)
+    redis = FakeRedis()
+    legacy = {"last_modified": str(now), "entity": fake_sense_box("a").model_dump()}
+    redis.set("a", json.dumps(legacy, default=str))
+    redis.set("Mock_find_all", json.dumps(["a"]))
+    delegate = fake_delegate(["a"])
+    uut = CachingRepository(delegate, SenseBox, redis)
+    # when
+    migrated = uut.migrate_legacy_keys()
+    result = uut.find("a")
+    # then
+    assert migrated == 1
+    assert "a" not in redis and "Mock_find_all" not in redis
+    assert result.id == "a"
+    assert uut.last_modified("a") == now
+    delegate.find.assert_not_called()
+
+
+def test_find_all_reads_from_replica():
+    """
+    Test the `CachingRepository.find_all` method with a replica.
+
+    Checks if cached entities are read from the replica
+    while refreshed entities are written to the primary.
+    """
+    # given
+    delegate = fake_delegate(["a", "b"])
+    replica = FakeRedis()
+    CachingRepository(delegate, SenseBox, replica).find("a")
+    delegate.find.reset_mock()
+    redis = FakeRedis()
+    uut = CachingRepository(delegate, SenseBox, redis, replica=replica)
+    # when
+    result = uut.find_all()
+    # then
+    assert [sense_box.id for sense_box in result] == ["a", "b"]
+    delegate.find.assert_called_once_with("b")
+    assert "hive:box:b" in redis
+    assert "hive:box:b" not in replica
+
+
+def test_refresh_skips_leased_entity():
+    """
+    Test the `CachingRepository.refresh` method for an entity leased by another worker.
+
+    Checks if a due entity is not requested from the delegate while
+    another worker holds its refresh lease.
+    """
+    # given
+    delegate = fake_delegate(["a"])
+    redis = FakeRedis()
+    redis.set("hive:lease:a", 1)
+    uut = CachingRepository(delegate, SenseBox, redis)
+    # when
+    refresh_at = uut.refresh("a")
+    # then
+    delegate.find.assert_not_called()
+    assert refresh_at > datetime.now(timezone.utc)
+
+
+def test_refresh_upstream_failure():
+    """
+    Test the `CachingRepository.refresh` method with a failing upstream.
+
+    Checks if a failed refresh keeps the cached entity and is retried by the scheduler.
+    """
+    # given
+    delegate = fake_delegate(["a"])
+    redis = FakeRedis()
+    uut = CachingRepository(delegate, SenseBox, redis, timedelta(0))
+    uut.find("a")
+    delegate.find.side_effect = requests.HTTPError("Server error 500")
+    # when
+    refresh_at = uut.refresh("a")
+    # then
+    assert refresh_at is None
+    assert cached_entity(redis, "a").entity["id"] == "a"
+
+
+def test_load_raises_on_upstream_failure():
+    """
+    Test the `CachingRepository.load` method with a failing upstream.
+
+    Checks if the failure is raised instead of treating the entity as not found.
+    """
+    # given
+    delegate = fake_delegate(["a"])
+    delegate.find.side_effect = requests.Timeout()
+    uut = CachingRepository(delegate, SenseBox, FakeRedis())
+    # when
+    with pytest.raises(requests.Timeout):
+        uut.load("a")
+    # then
+    delegate.find.assert_called_once_with("a")
+
+
+def test_find_serves_stale_entity_on_upstream_failure():
+    """
+    Test the `CachingRepository.find` method with a failing upstream.
+
+    Checks if a stale entity is served if refreshing it fails.
+    """
+    # given
+    delegate = fake_delegate(["a"])
+    redis = FakeRedis()
+    uut = CachingRepository(delegate, SenseBox, redis, timedelta(0))
+    uut.find("a")
+    delegate.find.side_effect = UpstreamRateLimited(60)
+    # when
+    result = uut.find("a")
+    # then
+    assert result.id == "a"
+    assert delegate.find.call_count == 2
+
+
+def test_find_overwrites_hash_in_place():
+    """
+    Test the `CachingRepository.find` method for an expired entity.
+
+    Checks if the hash of the entity is overwritten without deleting it first,
+    so that concurrent readers never see it missing.
+    """
+    # given
+    delegate = fake_delegate(["a"])
+    redis = FakeRedis()
+    uut = CachingRepository(delegate, SenseBox, redis, timedelta(0))
+    uut.find("a")
+    redis.delete = Mock(side_effect=AssertionError("hash deleted"))
+    # when
+    result = uut.find("a")
+    # then
+    assert result.id == "a"
+    assert delegate.find.call_count == 2
+    assert cached_entity(redis, "a").entity["id"] == "a"
+
+
+def test_find_serves_stale_entity_while_leased():
+    """
+    Test the `CachingRepository.find` method for a stale entity leased by another worker.
+
+    Checks if the stale entity is served without requesting the delegate
+    while another worker holds its refresh lease.
+    """
+    # given
+    delegate = fake_delegate(["a"])
+    redis = FakeRedis()
+    uut = CachingRepository(delegate, SenseBox, redis, timedelta(0))
+    uut.find("a")
+    redis.set("hive:lease:a", 1)
+    # when
+    result = uut.find("a")
+    # then
+    assert result.id == "a"
+    delegate.find.assert_called_once_with("a")
+
+
+def test_find_all_leaves_out_rate_limited_entities():
+    """
+    Test the `CachingRepository.find_all` and `CachingRepository.warm_up` methods
+    with a throttled delegate.
+
+    Checks if entities which are not cached and cannot be requested
+    are None instead of failing all entities.
+    """
+    # given
+    delegate = fake_delegate(["a", "b"])
+    redis = FakeRedis()
+    uut = CachingRepository(delegate, SenseBox, redis)
+    uut.find("a")
+    delegate.find.side_effect = UpstreamRateLimited(30)
+    # when
+    result = uut.find_all()
+    warmed_up = uut.warm_up()
+    # then
+    assert [sense_box and sense_box.id for sense_box in result] == ["a", None]
+    assert [sense_box and sense_box.id for sense_box in warmed_up] == ["a", None]
+
+
+def test_sense_box_repository_find_all_rate_limited():
+    """
+    Test the `SenseBoxRepository.find_all` method with a throttled client.
+
+    Checks if sense boxes which cannot be requested are None.
+    """
+    # given
+    client = Mock()
+    client.fetch_sense_box.side_effect = UpstreamRateLimited(30)
+    uut = SenseBoxRepository(client)
+    uut.sense_box_ids = ["a", "b"]
+    # when
+    result = uut.find_all()
+    # then
+    assert result == [None, None]
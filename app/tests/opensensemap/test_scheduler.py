@@ -0,0 +1,128 @@
+"""
+Module: test_scheduler.py
+
+This module contains unit tests for the methods in the hive.opensensemap.scheduler module.
+"""
+from datetime import datetime, timedelta, timezone
+import threading
+
+import pytest
+
+from hive.opensensemap.scheduler import RefreshPolicy, RefreshScheduler
+
+NOW = datetime(2024, 1, 17, 12, 0, tzinfo=timezone.utc)
+
+
+@pytest.fixture(name="policy")
+def fixture_policy():
+    """
+    Creates a RefreshPolicy without jitter.
+    """
+    return RefreshPolicy(
+        timedelta(minutes=5),
+        min_interval=timedelta(minutes=1),
+        max_interval=timedelta(hours=2),
+        grace=timedelta(seconds=15),
+        jitter=0,
+    )
+
+
+def test_next_refresh_without_interval(policy):
+    """
+    Test the `RefreshPolicy.next_refresh` method for a sense box seen the first time.
+
+    Checks if the default interval is used as long as no report interval is known.
+    """
+    # when
+    refresh_at, interval = policy.next_refresh(NOW - timedelta(minutes=1), now=NOW)
+    # then
+    assert refresh_at == NOW + timedelta(minutes=5)
+    assert interval is None
+
+
+def refresh_rounds(policy, report_interval, rounds):
+    """
+    Helper function to refresh a sense box reporting every report_interval
+    as scheduled by the policy for the given number of rounds.
+
+    Returns:
+        tuple: learned report interval and times of all refreshes.
+    """
+    now, measured_at, interval, updates, refreshed = NOW, None, None, 0, []
+    for _ in range(rounds):
+        previous_measured_at = measured_at
+        measured_at = NOW + (now - NOW) // report_interval * report_interval
+        updated = previous_measured_at is None or measured_at > previous_measured_at
+        updates = updates + 1 if updated else 0
+        refreshed.append(now)
+        now, interval = policy.next_refresh(
+            measured_at, previous_measured_at, interval, now, updates=updates
+        )
+    return interval, refreshed
+
+
+@pytest.mark.parametrize(
+    "report_interval", [timedelta(minutes=1), timedelta(minutes=2), timedelta(hours=1)]
+)
+def test_next_refresh_converges_to_report_interval(policy, report_interval):
+    """
+    Test the `RefreshPolicy.next_refresh` method over successive refreshes.
+
+    Checks if the report interval is learned, including intervals shorter than
+    the default interval, which refreshes only find by probing, and if
+    the sense box is refreshed about once per measurement.
+    """
+    # when
+    interval, refreshed = refresh_rounds(policy, report_interval, 40)
+    # then
+    assert interval == pytest.approx(report_interval.total_seconds(), rel=0.05)
+    measurements = (refreshed[-1] - refreshed[-21]) / report_interval
+    assert measurements - 1 <= 20 <= measurements * 1.3
+
+
+def test_next_refresh_overdue_measurement(policy):
+    """
+    Test the `RefreshPolicy.next_refresh` method when no new measurement was reported.
+
+    Checks if the refresh is retried after a fraction of the report interval.
+    """
+    # given
+    measured_at = NOW - timedelta(minutes=90)
+    # when
+    refresh_at, interval = policy.next_refresh(
+        measured_at, measured_at, previous_interval=3600, now=NOW
+    )
+    # then
+    assert interval == 3600
+    assert refresh_at == NOW + timedelta(minutes=15)
+
+
+def test_scheduler_refreshes_due_entities_in_order():
+    """
+    Test the `RefreshScheduler` class.
+
+    Checks if due entities are refreshed in order of their refresh time
+    and entities in the future are not refreshed.
+    """
+    # given
+    now = datetime.now(timezone.utc)
+    refreshed = []
+    done = threading.Event()
+
+    def refresh(entity_id):
+        refreshed.append(entity_id)
+        if len(refreshed) == 2:
+            done.set()
+        return now + timedelta(hours=1)
+
+    uut = RefreshScheduler(refresh)
+    uut.schedule("later", now + timedelta(hours=1))
+    uut.schedule("b", now - timedelta(seconds=1))
+    uut.schedule("a", now - timedelta(seconds=2))
+    # when
+    uut.start()
+    done.wait(5)
+    uut.stop()
+    # then
+    assert refreshed == ["a", "b"]
+    assert uut.backlog() == 0
@@ -172,12 +172,14 @@ def test_is_available(sensors_ready, timedeltas, expected_result):
     Test the `OpenSenseMapAvailabilityService.is_available` method
     with several sensor_ready results and timedeltas as input (parameterized).
 
-    Checks if the method returns True when enough sensors are available or caches are present,
+    Checks if the method returns True when enough sensors are cached or caches are fresh,
     False otherwise.
     """
     # given
     mock_repository = Mock()
-    mock_repository.find_all.return_value = sensors_ready
+    mock_repository.sense_box_ids = [str(i) for i in range(len(sensors_ready))]
+    mock_repository.count.return_value = len(sensors_ready) - sensors_ready.count(None)
+    since = datetime.now(timezone.utc) - timedelta(minutes=5)
     now = datetime.now(timezone.utc)
     last_modified_times = map(
         lambda td: now - timedelta(minutes=td) if td else None, timedeltas
@@ -188,6 +190,10 @@ def test_is_available(sensors_ready, timedeltas, expected_result):
     result = uut.is_available()
     # then
     assert result == expected_result
+    mock_repository.find_all.assert_not_called()
+    entity_ids, kwargs = mock_repository.count.call_args
+    assert entity_ids == (mock_repository.sense_box_ids,)
+    assert kwargs["since"] >= since
 
 
 @pytest.mark.parametrize(
@@ -0,0 +1,58 @@
+"""
+Module: test_multiprocess.py
+
+This module contains unit tests for the methods in the hive.multiprocess module.
+"""
+import os
+import subprocess
+import sys
+
+from hive.multiprocess import setup_multiprocess_metrics
+
+
+def dead_pid():
+    """
+    Returns the pid of a process that has already exited.
+    """
+    with subprocess.Popen([sys.executable, "-c", "pass"]) as process:
+        process.wait()
+    return process.pid
+
+
+def test_setup_multiprocess_metrics_removes_dead_live_gauges(monkeypatch, tmp_path):
+    """
+    Test the `setup_multiprocess_metrics` method.
+
+    Checks if live gauge files of dead workers are removed while files of running workers
+    and counters of dead workers are kept.
+    """
+    # given
+    pid = dead_pid()
+    for filename in [
+        f"gauge_livemostrecent_{pid}.db",
+        f"counter_{pid}.db",
+        f"gauge_livemostrecent_{os.getpid()}.db",
+    ]:
+        (tmp_path / filename).touch()
+    monkeypatch.setenv("PROMETHEUS_MULTIPROC_DIR", str(tmp_path))
+    # when
+    setup_multiprocess_metrics()
+    # then
+    assert sorted(os.listdir(tmp_path)) == sorted(
+        [f"counter_{pid}.db", f"gauge_livemostrecent_{os.getpid()}.db"]
+    )
+
+
+def test_setup_multiprocess_metrics_creates_directory(monkeypatch, tmp_path):
+    """
+    Test the `setup_multiprocess_metrics` method.
+
+    Checks if the configured multiprocess directory is created.
+    """
+    # given
+    directory = tmp_path / "prometheus"
+    monkeypatch.setenv("PROMETHEUS_MULTIPROC_DIR", str(directory))
+    # when
+    setup_multiprocess_metrics()
+    # then
+    assert directory.is_dir()
@@ -0,0 +1,147 @@
+"""
+Module: test_profiling.py
+
+This module contains unit tests for the methods in the hive.profiling module.
+"""
+from datetime import datetime, timezone
+import threading
+import time
+from unittest.mock import Mock
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+import pytest
+
+from hive.opensensemap.model import Measurement, SenseBox, Sensor
+from hive.opensensemap.service import OpenSenseMapTemperatureService
+from hive.profiling import ProfilingMiddleware, StackSampler
+
+
+def busy_average_temperature():
+    """
+    Runs hive code for a while so that it is sampled.
+    """
+    measurement = Measurement(created_at=datetime.now(timezone.utc), value=20)
+    sensors = [
+        Sensor(id=str(i), title="humidity", last_measurement=measurement)
+        for i in range(1000)
+    ]
+    sensors.append(Sensor(id="t", title="temperatur", last_measurement=measurement))
+    repository = Mock()
+    repository.find_all.return_value = [
+        SenseBox(id=str(i), name="some-name", sensors=sensors) for i in range(10)
+    ]
+    uut = OpenSenseMapTemperatureService(repository)
+    deadline = time.perf_counter() + 0.2
+    while time.perf_counter() < deadline:
+        uut.calculate_average_temperature()
+
+
+@pytest.fixture(name="profiled_app")
+def fixture_profiled_app(tmp_path):
+    """
+    Creates an app with a single sync endpoint running hive code
+    wrapped in the ProfilingMiddleware.
+    """
+    app = FastAPI()
+
+    @app.get("/busy")
+    def busy():
+        busy_average_temperature()
+
+    app.add_middleware(ProfilingMiddleware, directory=str(tmp_path), token="secret")
+    return app
+
+
+def test_sampler_records_hive_stacks():
+    """
+    Test the `StackSampler` class.
+
+    Checks if stacks executing hive code are recorded in collapsed-stack format.
+    """
+    # given
+    uut = StackSampler()
+    # when
+    uut.start()
+    busy_average_temperature()
+    uut.stop()
+    # then
+    collapsed = uut.collapsed()
+    assert "calculate_average_temperature (service.py:" in collapsed
+    stack, count = collapsed.splitlines()[0].rsplit(" ", 1)
+    assert ";" in stack
+    assert int(count) > 0
+
+
+def test_middleware_profiles_request_with_token(profiled_app, tmp_path):
+    """
+    Test the `ProfilingMiddleware` class.
+
+    Checks if a request with a valid admin token is profiled and the trace is stored.
+    """
+    # given
+    client = TestClient(profiled_app)
+    # when
+    response = client.get("/busy", headers={"X-Hive-Profile": "secret"})
+    # then
+    assert response.status_code == 200
+    trace = tmp_path / response.headers["X-Hive-Profile-Trace"]
+    assert "busy_average_temperature" in trace.read_text(encoding="utf-8")
+
+
+def test_sampler_skips_background_threads():
+    """
+    Test the `StackSampler` class with a background thread running hive code.
+
+    Checks if threads other than the starting thread and the threadpool are not sampled.
+    """
+    # given
+    background = threading.Thread(target=busy_average_temperature, name="refresher")
+    uut = StackSampler()
+    # when
+    uut.start()
+    background.start()
+    background.join()
+    uut.stop()
+    # then
+    assert uut.collapsed() == ""
+
+
+def test_middleware_keeps_latest_traces(tmp_path):
+    """
+    Test the `ProfilingMiddleware` class with profiling always on.
+
+    Checks if only the latest `max_traces` traces are kept.
+    """
+    # given
+    app = FastAPI()
+
+    @app.get("/busy")
+    def busy():
+        busy_average_temperature()
+
+    app.add_middleware(
+        ProfilingMiddleware, directory=str(tmp_path), always=True, max_traces=2
+    )
+    client = TestClient(app)
+    # when
+    traces = [client.get("/busy").headers["X-Hive-Profile-Trace"] for _ in range(3)]
+    # then
+    assert sorted(path.name for path in tmp_path.iterdir()) == sorted(traces[1:])
+
+
+@pytest.mark.parametrize("headers", [{}, {"X-Hive-Profile": "wrong"}])
+def test_middleware_skips_request_without_token(profiled_app, tmp_path, headers):
+    """
+    Test the `ProfilingMiddleware` class.
+
+    Checks if requests without a valid admin token are not profiled.
+    """
+    # given
+    client = TestClient(profiled_app)
+    # when
+    response = client.get("/busy", headers=headers)
+    # then
+    assert response.status_code == 200
+    assert "X-Hive-Profile-Trace" not in response.headers
+    assert not list(tmp_path.iterdir())
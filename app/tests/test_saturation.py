@@ -0,0 +1,41 @@
+"""
+Module: test_saturation.py
+
+This module contains unit tests for the methods in the hive.saturation module.
+"""
+import asyncio
+import time
+
+from prometheus_client import Gauge, REGISTRY
+
+from hive.saturation import SaturationMonitor
+
+probe_gauge = Gauge("test_saturation_probe", "Gauge sampled in tests")
+
+
+def test_monitor_samples_gauges():
+    """
+    Test the `SaturationMonitor.run` method.
+
+    Checks if the event loop lag caused by blocking the loop and the values
+    of registered probes are sampled.
+    """
+    # given
+    uut = SaturationMonitor(interval=0.01)
+    uut.add_probe(probe_gauge, lambda: 42)
+
+    async def scenario():
+        task = asyncio.create_task(uut.run())
+        await asyncio.sleep(0.02)
+        time.sleep(0.1)  # blocks the event loop
+        for _ in range(5):  # lets the monitor run, within less than its interval
+            await asyncio.sleep(0)
+        lag = REGISTRY.get_sample_value("hive_event_loop_lag_seconds")
+        task.cancel()
+        return lag
+
+    # when
+    lag = asyncio.run(scenario())
+    # then
+    assert lag > 0.05
+    assert REGISTRY.get_sample_value("test_saturation_probe") == 42